@@ -78,6 +78,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shelves.logs.RequestLogMiddleware',  # First, to time the whole stack
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # From django-cors-headers
     'django.middleware.locale.LocaleMiddleware',  # Middleware order matters
@@ -224,3 +225,89 @@ REGISTRATION_AUTO_LOGIN = True  # Automatically log the user in
 
 
 # LOGIN_REDIRECT_URL = '/'
+
+
+# NOTE: Shelves
+# Maximum number of containers for one shelf.
+SHELVES_MAX_CONTAINERS = 2**12
+# Containers per INSERT statement when a shelf is created. Backends with a
+# lower limit of query parameters (SQLite) split the batch further.
+SHELVES_CONTAINERS_BATCH_SIZE = 500
+
+# Customers per INSERT statement when a CSV file is imported.
+SHELVES_IMPORT_CHUNK_SIZE = 1000
+# Seconds between two polls of the shelf events and lifetime of a stream
+# without events, which holds a web worker meanwhile.
+SHELVES_EVENTS_INTERVAL = 1
+SHELVES_EVENTS_TIMEOUT = 20
+# Maximum bytes of an attachment and of each part of its upload.
+SHELVES_UPLOAD_MAX_SIZE = 2**30
+SHELVES_UPLOAD_PART_SIZE = 8 * 2**20
+# Pixels of the longest side of the attachment previews.
+SHELVES_PREVIEW_SIZE = 256
+# Characters of attachment text indexed for each binder.
+SHELVES_TEXT_MAX_LENGTH = 2**17
+# Maximum customer codes and binder ids located by one request.
+SHELVES_LOCATE_MAX_KEYS = 1000
+# Binders a container holds when the binders are allocated.
+SHELVES_CONTAINER_CAPACITY = 1
+# Maximum binders moved by one request.
+SHELVES_MOVE_MAX_BINDERS = 5000
+# Binders of a page of search results and seconds they stay cached.
+SHELVES_SEARCH_PAGE_SIZE = 20
+SHELVES_SEARCH_CACHE_TIMEOUT = 300
+# Maximum SQL queries of the views by URL name, checked by the tests and by
+# `shelves.queries.QueryBudgetMiddleware` in development.
+SHELVES_QUERY_BUDGETS = {
+    'shelves-api:shelf-detail': 5,
+    'admin:shelves_customer_changelist': 6,
+    'admin:shelves_shelf_changelist': 5,
+    'admin:shelves_container_changelist': 5,
+    'admin:shelves_binder_changelist': 7,
+}
+
+
+# NOTE: Logging
+# The records of the apps are queued and written as JSON lines by a thread
+# of `shelves.logs.QueueListenerHandler`, so the requests never wait for the
+# file. The debug records reach the handler, which keeps a sample of them.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'shelves.logs.JSONFormatter',
+        },
+    },
+    'filters': {
+        'request': {
+            '()': 'shelves.logs.RequestContextFilter',
+        },
+        'sample': {
+            '()': 'shelves.logs.SamplingFilter',
+            'rate': 0.1,
+        },
+    },
+    'handlers': {
+        # NOTE: Configured before `queue`, which refers to it by name.
+        'file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'api.log'),
+            'maxBytes': 10 * 2**20,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'json',
+        },
+        'queue': {
+            'class': 'shelves.logs.QueueListenerHandler',
+            'handlers': ['cfg://handlers.file'],
+            'filters': ['request', 'sample'],
+        },
+    },
+    'loggers': {
+        'shelves': {
+            'handlers': ['queue'],
+            'level': 'DEBUG',
+        },
+    },
+}
@@ -7,6 +7,9 @@ DEBUG = True
 # NOTE: The request user id for debugging.
 DEBUG_USER_ID = 1
 
+# NOTE: Count the queries of each request, see `X-Query-Count`.
+MIDDLEWARE = MIDDLEWARE + ['shelves.queries.QueryBudgetMiddleware']
+
 
 # NOTE: django-rest-framework
 # Override default permission for debugging purposes
@@ -15,6 +18,11 @@ REST_FRAMEWORK['DEFAULT_PERMISSION_CLASSES'] = [
 ]
 
 
+# NOTE: Logging
+# Keep the debug records of every request, see `tail -f api.log`.
+LOGGING['filters']['sample']['rate'] = 1.0
+
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = '2@@o#qa)xros@$n)3x=(gms!5!-8ke1w$^48#w2!dsyi@eti4j'
 
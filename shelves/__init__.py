@@ -2,3 +2,5 @@
 
 __title__ = "shelves"
 __version__ = "0.3.4"
+
+default_app_config = 'shelves.apps.ShelvesConfig'
@@ -1,10 +1,7 @@
-import csv
-
-from django.contrib import admin
-from django.utils.translation import ugettext as _
-from django.core.files.storage import default_storage
-from django.db import IntegrityError
+from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.utils.translation import ugettext as _
 
 from django import forms
 
@@ -14,6 +11,8 @@ from wagtail.contrib.modeladmin.options import (
     modeladmin_register
 )
 
+from .imports import queue_import
+from .moves import apply_moves, plan_compaction
 from .models import (
     Customer,
     Shelf,
@@ -21,6 +20,7 @@ from .models import (
     Binder,
     Upload,
     Attached,
+    ImportJob,
 )
 
 
@@ -34,13 +34,19 @@ class CustomerAdmin(admin.ModelAdmin):
         "get_author_username",
     )
     prepopulated_fields = {"code": ("name",)}
+    list_select_related = ('author',)
+
+    def get_queryset(self, request):
+        """Join the binder id, so the rows don't query one each."""
+        return super().get_queryset(request).annotate(
+            binder_pk=F('binder__id'))
 
     def get_binder_id(self, obj):
-        binder = Binder.objects.get(customer=obj)
-        if binder.id:
-            return "{}".format(binder.id)
+        if obj.binder_pk:
+            return "{}".format(obj.binder_pk)
 
     get_binder_id.short_description = _("Binder id")
+    get_binder_id.admin_order_field = 'binder_pk'
 
     def get_author_username(self, obj):
         return obj.author.username
@@ -110,20 +116,35 @@ class ShelfAdmin(admin.ModelAdmin):
         'get_binders_number',
         'get_author_username',
     )
+    list_select_related = ('author',)
 
     def get_binders_number(self, obj):
-        binders = Binder.objects.all()
-        containers_with_binders = set([i.container for i in binders])
-        containers = set(Container.objects.filter(shelf=obj))
-        return len(containers_with_binders & containers)
+        return obj.binders_count
 
     get_binders_number.short_description = _('Binders number')
+    get_binders_number.admin_order_field = 'binders_count'
 
     def get_author_username(self, obj):
         return obj.author.username
 
     get_author_username.short_description = _('Author username')
 
+    actions = ['compact']
+
+    def compact(self, request, queryset):
+        """Pack the binders of the shelves in their first containers."""
+        for shelf in queryset:
+            try:
+                moved = apply_moves(plan_compaction(shelf))
+            except ValidationError as e:
+                self.message_user(
+                    request, ' '.join(e.messages), messages.ERROR)
+            else:
+                self.message_user(request, _(
+                    'Shelf {}: {} binders moved.').format(shelf, moved))
+
+    compact.short_description = _('Compact the selected shelves')
+
     def get_readonly_fields(self, request, obj=None):
         """Make ``author`` field and dimensional fields readonly."""
         if obj and request.user.is_superuser:
@@ -156,6 +177,7 @@ class ContainerAdmin(admin.ModelAdmin):
     list_display = ('id', 'col', 'row', 'shelf', 'get_shelf_name')
     readonly_fields = ('shelf', 'col', 'row')
     fields = ('shelf', ('col', 'row'))
+    list_select_related = ('shelf',)
     # prepopulated_fields = {'jsoncoord': ('col', 'row',)}
 
     def get_shelf_name(self, obj):
@@ -172,6 +194,7 @@ class ContainerAdmin(admin.ModelAdmin):
 class AttachedInline(admin.TabularInline):
     model = Attached
     extra = 1
+    readonly_fields = ('preview_status', 'text_status')
 
 
 @admin.register(Binder)
@@ -195,17 +218,17 @@ class BinderAdmin(admin.ModelAdmin):
             return obj.customer.code
 
     def get_container_id(self, obj):
-        if obj.container:
-            return obj.container.id
+        return obj.container_id
 
     def get_shelf_id(self, obj):
-        if obj.container.shelf:
-            return obj.container.shelf.id
+        return obj.container.shelf_id
 
     get_customer_code.short_description = _('Customer code')
     get_customer_name.short_description = _('Customer name')
     get_container_id.short_description = _('Container')
     get_shelf_id.short_description = _('Shelf')
+    get_container_id.admin_order_field = 'container'
+    get_shelf_id.admin_order_field = 'container__shelf'
 
     list_display = (
         'id',
@@ -216,6 +239,7 @@ class BinderAdmin(admin.ModelAdmin):
         'get_customer_name',
         'get_container_id',
         'get_shelf_id')
+    list_select_related = ('customer', 'container')
 
     list_filter = ('customer', 'container__shelf__name')
 
@@ -225,7 +249,7 @@ class UploadAdmin(admin.ModelAdmin):
     list_display = ("csv_file", )
 
     def save_model(self, request, obj, form, change):
-        """Create customers from a CSV file.
+        """Queue the creation of customers from a CSV file.
 
         .. _Save model:
             https://docs.djangoproject.com/en/2.0/ref/contrib/admin/#django.contrib.admin.ModelAdmin.save_model
@@ -233,58 +257,42 @@ class UploadAdmin(admin.ModelAdmin):
         """
         super().save_model(request, obj, form, change)
 
-        # Import CSV data
-        # http://stackoverflow.com/questions/2459979/
-        with open(default_storage.path(obj.csv_file)) as f:
-            has_header = csv.Sniffer().has_header(f.read(1024))
-            f.seek(0)
-            if has_header:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        Customer.objects.get_or_create(
-                            name=row['name'],
-                            code=row['code'],
-                            note=row['note'],
-                            author=request.user
-                        )
-                    except IntegrityError as e:
-                        """
-                        An integrity error may happen if two customers have the
-                        same code.
-                        """
-                        # print('{0!r}'.format(e))
-                        raise ValidationError(e, code='integrity')
-                    except KeyError as e:
-                        """
-                        Key error may happen if CSV header is divergent
-                        from model fields
-                        """
-                        try:
-                            """
-                            Pretend internationalized field name match the
-                            CSV header
-                            """
-                            Customer.objects.get_or_create(
-                                name=row[_('name')],
-                                code=row[_('code')],
-                                note=row[_('note')],
-                                author=request.user
-                            )
-                        except KeyError as e:
-                            raise ValidationError(
-                                'Is the field {} present in the CSV file '
-                                'header?'.format(e),
-                                code='key'
-                            )
-
+        if not change:
+            job, queued = queue_import(obj, request.user)
+            if queued:
+                message = _('The import job {} has been queued.')
             else:
-                raise ValidationError(
-                    _(
-                        'The CSV file require a proper header in order.'
-                        'Be sure to provide an id field.'
-                    ), code='invalid'
-                )
+                message = _('The file is already being imported by the '
+                            'import job {}.')
+            self.message_user(request, message.format(job.id))
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'upload',
+        'author',
+        'status',
+        'rows',
+        'customers_created',
+        'customers_skipped',
+        'queued',
+        'finished',
+    )
+    list_filter = ('status',)
+    list_select_related = ('upload', 'author')
+    readonly_fields = (
+        'upload',
+        'author',
+        'status',
+        'rows',
+        'customers_created',
+        'customers_skipped',
+        'errors',
+        'started',
+        'finished',
+    )
 
 
 class CustomerWagtailAdmin(ModelAdmin):
@@ -0,0 +1,144 @@
+"""Find a free container for a new binder.
+
+The free containers of the author shelves are indexed in memory from one
+query of the occupancy counters, then ranked by:
+
+1. the preferred shelves, if any;
+2. the distance to the binders of the customers next in code order, so
+   that the binders stay sorted on the shelves;
+3. the occupancy of the shelf, to balance the shelves;
+4. the position, so that the ranking is stable.
+
+The best container is locked with ``select_for_update`` and checked again
+before the binder is created in it, so concurrent allocations never put
+more binders in a container than ``SHELVES_CONTAINER_CAPACITY``.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.translation import ugettext as _
+
+from .models import Container, BinderLocation
+
+FAR = float('inf')
+
+
+class FreeSlots:
+    """The free containers of a shelf and their positions.
+
+    The containers without column and row are placed on one line by id.
+    """
+
+    def __init__(self, shelf_id, code):
+        self.shelf_id = shelf_id
+        self.code = code
+        self.size = 0
+        self.occupied = 0
+        self.positions = {}
+        self.cells = {}
+        self.free = []
+
+    def add(self, container_id, col, row, binders_count, capacity):
+        position = (col, row) if col is not None else (self.size, 0)
+        self.positions[container_id] = position
+        self.cells[container_id] = (col, row)
+        self.size += 1
+        self.occupied += min(binders_count, capacity)
+        if binders_count < capacity:
+            self.free.append(container_id)
+
+    @property
+    def occupancy(self):
+        return self.occupied / self.size if self.size else 1
+
+    def distance(self, container_id, neighbours):
+        """Return the distance of a container to the nearest neighbour
+        container of this shelf.
+        """
+        col, row = self.positions[container_id]
+        return min((
+            abs(col - self.positions[neighbour][0]) +
+            abs(row - self.positions[neighbour][1])
+            for neighbour in neighbours if neighbour in self.positions
+        ), default=FAR)
+
+
+def build_index(author, capacity=None):
+    """Return the ``FreeSlots`` of the shelves of ``author`` by shelf id."""
+    capacity = capacity or settings.SHELVES_CONTAINER_CAPACITY
+    values = Container.objects.filter(
+        shelf__author=author
+    ).order_by('shelf', 'id').values_list(
+        'shelf', 'shelf__code', 'id', 'col', 'row', 'binders_count')
+    index = {}
+    for shelf_id, code, container_id, col, row, count in values:
+        if shelf_id not in index:
+            index[shelf_id] = FreeSlots(shelf_id, code)
+        index[shelf_id].add(container_id, col, row, count, capacity)
+    return index
+
+
+def get_neighbours(author, customer_code):
+    """Return the containers of the binders of the customers before and
+    after ``customer_code``.
+    """
+    if not customer_code:
+        return []
+    locations = BinderLocation.objects.filter(author=author).exclude(
+        customer_code='').values_list('container', flat=True)
+    return [
+        container for container in (
+            locations.filter(
+                customer_code__lt=customer_code
+            ).order_by('-customer_code').first(),
+            locations.filter(
+                customer_code__gt=customer_code
+            ).order_by('customer_code').first(),
+        ) if container
+    ]
+
+
+def rank(author, customer_code=None, shelves=(), capacity=None):
+    """Return the free containers of ``author`` best first, as
+    ``(container_id, shelf)`` tuples, ``shelf`` being a ``FreeSlots``.
+    """
+    index = build_index(author, capacity)
+    neighbours = get_neighbours(author, customer_code)
+    candidates = []
+    for slots in index.values():
+        for container_id in slots.free:
+            candidates.append(((
+                slots.code not in shelves,
+                slots.distance(container_id, neighbours),
+                slots.occupancy,
+                slots.positions[container_id][::-1],
+                container_id,
+            ), container_id, slots))
+    candidates.sort(key=lambda candidate: candidate[0])
+    return [(container_id, slots) for __, container_id, slots in candidates]
+
+
+def suggest(author, customer_code=None, shelves=(), limit=5):
+    """Return the ``limit`` best free containers of ``author``."""
+    return [{
+        'container': container_id,
+        'shelf': slots.code,
+        'col': slots.cells[container_id][0],
+        'row': slots.cells[container_id][1],
+        'occupancy': round(slots.occupancy, 3),
+    } for container_id, slots in rank(author, customer_code, shelves)[:limit]]
+
+
+def reserve(author, customer_code=None, shelves=(), capacity=None):
+    """Lock and return the best free container of ``author``.
+
+    Call within a transaction and create the binder before committing it:
+    a concurrent allocation waits for the lock, then finds the container
+    full and takes the next one.
+    """
+    capacity = capacity or settings.SHELVES_CONTAINER_CAPACITY
+    for container_id, __ in rank(author, customer_code, shelves, capacity):
+        container = Container.objects.select_for_update().filter(
+            pk=container_id, binders_count__lt=capacity).first()
+        if container:
+            return container
+    raise ValidationError(_('There are no free containers.'), code='full')
@@ -0,0 +1,110 @@
+"""Conditional GET of the shelves API resources.
+
+The ``ETag`` and ``Last-Modified`` validators are computed from one
+aggregate query (latest ``updated`` timestamps and row counts) instead of
+the serialized payload, so a client polling an unchanged resource gets a
+304 without the server building it.
+
+A deletion changes the row counts of the ``ETag`` but no ``updated``
+timestamp, so ``Last-Modified`` is sent only when the deletions are
+dated: by the binder deletions log, or by the ``updated`` timestamp of the
+retrieved resource itself.
+"""
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+from ..models import BinderDeletion
+
+# NOTE: Django 1.11 matches the quoted ETags, Django 1.10 the unquoted ones.
+QUOTED_ETAGS = parse_etags('"etag"') == ['"etag"']
+
+
+class ConditionalGetMixin(object):
+    """Answer conditional ``list`` and ``retrieve`` requests.
+
+    - ``last_modified_fields``: timestamps whose maximum dates the resource;
+    - ``count_fields``: relations whose number of rows changes on delete;
+    - ``binder_deletions``: whether the resource lists binders, whose
+      deletions are logged.
+    """
+    last_modified_fields = ('updated',)
+    count_fields = ('pk',)
+    binder_deletions = False
+    # NOTE: Whether the response has a ``Last-Modified``, set by ``list()``.
+    dated = True
+
+    def get_deleted(self):
+        """Return the date of the latest deletion of a binder of the author.
+        """
+        author_id = settings.DEBUG_USER_ID or self.request.user.pk
+        return BinderDeletion.objects.filter(author_id=author_id).aggregate(
+            deleted=Max('deleted'))['deleted']
+
+    def get_validators(self, queryset):
+        """Return the ``(etag, last_modified)`` of ``queryset``."""
+        aggregates = {
+            'count{}'.format(i): Count(field, distinct=True)
+            for i, field in enumerate(self.count_fields)
+        }
+        aggregates.update({
+            'updated{}'.format(i): Max(field)
+            for i, field in enumerate(self.last_modified_fields)
+        })
+        values = queryset.order_by().aggregate(**aggregates)
+        counts = [values['count{}'.format(i)]
+                  for i in range(len(self.count_fields))]
+        dates = [values['updated{}'.format(i)]
+                 for i in range(len(self.last_modified_fields))]
+        if self.dated and self.binder_deletions:
+            dates.append(self.get_deleted())
+        dates = [date for date in dates if date]
+        if not dates and not any(counts):
+            return None, None
+        last_modified = max(dates) if dates else None
+        # NOTE: Each user and each format has its own representation.
+        key = '{}:{}:{}:{}'.format(
+            self.request.user.pk,
+            self.request.accepted_renderer.format,
+            counts,
+            last_modified.isoformat() if last_modified else '',
+        )
+        etag = hashlib.md5(key.encode()).hexdigest()
+        return etag, last_modified
+
+    def conditional(self, queryset, method, request, *args, **kwargs):
+        """Call ``method`` unless the client representation is fresh."""
+        etag, last_modified = self.get_validators(queryset)
+        if etag is None:
+            return method(request, *args, **kwargs)
+        timestamp = timegm(last_modified.utctimetuple()) \
+            if last_modified else None
+        quoted_etag = quote_etag(etag)
+        response = get_conditional_response(
+            request, etag=quoted_etag if QUOTED_ETAGS else etag,
+            last_modified=timestamp if self.dated else None)
+        if response is None:
+            response = method(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = quoted_etag
+            if timestamp and self.dated:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # NOTE: The deletions of the listed rows are dated by the log only.
+        self.dated = self.binder_deletions
+        return self.conditional(
+            queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return self.conditional(
+            queryset, super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,69 @@
+"""Keyset pagination of the shelves API.
+
+The cursor encodes the position in an indexed column, so a deep page costs
+the same as the first one and no page needs a ``COUNT(*)``.
+The page size comes from ``REST_FRAMEWORK['PAGE_SIZE']``.
+"""
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CodeCursorPagination(CursorPagination):
+    """For resources with a ``code`` unique together with the author."""
+    ordering = 'code'
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = 'id'
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+
+
+class BinderCursorPagination(CursorPagination):
+    """Newest binders first.
+
+    The cursor keeps the first ordering field only, which must be unique:
+    ``updated`` is not, so the binders are ordered by id.
+    """
+    ordering = '-id'
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+
+
+class SearchPagination(LimitOffsetPagination):
+    """Search results are ordered by rank, which can't be a cursor.
+
+    One more result than the limit tells whether there is a next page, so
+    no page needs a ``COUNT(*)`` and the response has no ``count``.
+    """
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.request = request
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
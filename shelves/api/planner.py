@@ -0,0 +1,52 @@
+"""Derive the related lookups of a queryset from its serializer.
+
+Nested serializers fire one query per related object unless the queryset
+fetches the relations beforehand. Walking the serializer fields:
+
+- a nested serializer of a forward relation is joined (``select_related``);
+- a nested list serializer or a many related field is prefetched, the
+  prefetch queryset being planned in turn for the child serializer.
+
+So the number of queries depends on the depth of the serializer tree only,
+not on the number of serialized objects.
+"""
+from django.db.models import Prefetch
+
+from rest_framework import serializers
+
+
+def get_lookups(serializer, prefix=''):
+    """Return the ``(select_related, prefetch_related)`` lookups of a
+    serializer, prefixed by ``prefix``.
+    """
+    select_related, prefetch_related = [], []
+    for field in serializer.fields.values():
+        if field.source == '*' or '.' in field.source:
+            continue
+        lookup = prefix + field.source
+
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            queryset = plan_queryset(
+                child.Meta.model._default_manager.all(), child)
+            prefetch_related.append(Prefetch(lookup, queryset=queryset))
+        elif isinstance(field, serializers.BaseSerializer):
+            select_related.append(lookup)
+            nested = get_lookups(field, prefix=lookup + '__')
+            select_related.extend(nested[0])
+            prefetch_related.extend(nested[1])
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch_related.append(lookup)
+    return select_related, prefetch_related
+
+
+def plan_queryset(queryset, serializer):
+    """Fetch the relations of ``queryset`` needed by ``serializer``."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    select_related, prefetch_related = get_lookups(serializer)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
@@ -1,5 +1,5 @@
-import os
 import logging
+from collections import Counter
 # from collections import OrderedDict
 
 from django.contrib.auth.models import User
@@ -15,15 +15,12 @@ from ..models import (
     Shelf,
     Binder,
     Upload,
+    ImportJob,
+    Attached,
+    AttachmentUpload,
 )
 
-# NOTE: Logging configuration used by the debug window in `startsession.sh`.
-logging.basicConfig(
-    filename=os.path.join(settings.BASE_DIR, 'api.log'),
-    level=logging.DEBUG if settings.DEBUG else logging.WARNING,
-    format="%(levelname)s %(asctime)s %(message)s",
-    filemode="w"  # Run `tail` with `-vn +1` option to output all the rows
-)
+logger = logging.getLogger(__name__)
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -45,6 +42,49 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
+def code_exists(serializer, code):
+    """Check the ``code`` among the author instances but the current one.
+
+    The query is an indexed EXISTS on the unique together ``code`` and
+    ``author`` fields.
+    """
+    if code is None:
+        return False
+    queryset = serializer.Meta.model.objects.filter(
+        author=serializer.context['request'].user, code=code)
+    if serializer.instance is not None:
+        queryset = queryset.exclude(pk=serializer.instance.pk)
+    return queryset.exists()
+
+
+class UniqueCodeListSerializer(serializers.ListSerializer):
+    """Validate unique together ``author`` and ``code`` fields of many
+    objects at once.
+
+    The child serializers skip their own check when they belong to a list.
+    """
+
+    # NOTE: Keep the ``IN`` clause below the SQLite variables limit.
+    chunk_size = 500
+
+    def validate(self, attrs):
+        model = self.child.Meta.model
+        codes = [item['code'] for item in attrs if item.get('code')]
+        duplicates = {
+            code for code, count in Counter(codes).items() if count > 1}
+        queryset = model.objects.filter(
+            author=self.context['request'].user)
+        for i in range(0, len(codes), self.chunk_size):
+            duplicates.update(queryset.filter(
+                code__in=codes[i:i + self.chunk_size]
+            ).values_list('code', flat=True))
+        if duplicates:
+            raise ValidationError(
+                _('{} with this Code already exists: {}.').format(
+                    model._meta.verbose_name, ', '.join(sorted(duplicates))))
+        return attrs
+
+
 class CustomerSerializer(serializers.HyperlinkedModelSerializer):
 
     '''
@@ -77,15 +117,15 @@ class CustomerSerializer(serializers.HyperlinkedModelSerializer):
 
     def validate(self, data):
         """Validate unique together ``author`` and ``code`` fields."""
-        custs = Customer.objects.filter(author=self.context['request'].user)
-        # print('{:#^79}'.format(' Get all author instances but current '))
-        instances = filter(lambda x: x != self.instance, custs)
-        if data.get('code') in map(lambda x: x.code, instances):
+        if isinstance(self.parent, UniqueCodeListSerializer):
+            return data
+        if code_exists(self, data.get('code')):
             raise ValidationError(_('Customer with this Code already exists.'))
         return data
 
     class Meta:
         model = Customer
+        list_serializer_class = UniqueCodeListSerializer
         # NOTE: The author is created from the generic view.
         fields = (
             # 'author',
@@ -224,7 +264,6 @@ class BinderSerializer(serializers.ModelSerializer):
         customer_data = validated_data.pop('customer')
 
         # NOTE: Logging the binder.
-        logger = logging.getLogger()
         logger.info("The context request user.")
         logger.debug(self.context['request'].user)
         logger.debug(self)
@@ -282,8 +321,33 @@ class BinderListSerializer(serializers.ModelSerializer):
         )
 
 
+class AttachedSerializer(serializers.ModelSerializer):
+
+    preview = serializers.SerializerMethodField()
+
+    def get_preview(self, obj):
+        url = obj.get_preview_url()
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
+
+    class Meta:
+        model = Attached
+        fields = (
+            'id',
+            'title',
+            'file',
+            'preview',
+            'preview_status',
+        )
+
+
 class BinderCreateRetrieveUpdateDestroySerializer(serializers.ModelSerializer):
 
+    attachments = AttachedSerializer(
+        source='attached_set', many=True, read_only=True)
+
     class Meta:
         model = Binder
         fields = (
@@ -293,7 +357,8 @@ class BinderCreateRetrieveUpdateDestroySerializer(serializers.ModelSerializer):
             'content',
             'container',
             'customer',
-            'updated'
+            'updated',
+            'attachments',
         )
 
 
@@ -312,6 +377,7 @@ class ContainerSerializer(serializers.HyperlinkedModelSerializer):
             'url',
             'id',
             'binder_set',
+            'binders_count',
             'coords'
         )
         extra_kwargs = {
@@ -328,8 +394,9 @@ class ShelfListSerializer(serializers.HyperlinkedModelSerializer):
 
     def validate(self, data):
         """Validate unique together ``author`` and ``code`` fields."""
-        shelves = Shelf.objects.filter(author=self.context['request'].user)
-        if data.get('code') in map(lambda x: x.code, shelves):
+        if isinstance(self.parent, UniqueCodeListSerializer):
+            return data
+        if code_exists(self, data.get('code')):
             raise ValidationError(_('Shelf with this Code already exists.'))
         return data
 
@@ -352,6 +419,7 @@ class ShelfListSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = Shelf
+        list_serializer_class = UniqueCodeListSerializer
         # NOTE: The author is created from the generic view.
         fields = (
             # 'author_username',
@@ -361,8 +429,10 @@ class ShelfListSerializer(serializers.HyperlinkedModelSerializer):
             'code',
             'cols',
             'rows',
-            'nums'
+            'nums',
+            'binders_count'
         )
+        read_only_fields = ('binders_count',)
         extra_kwargs = {
             'url': {
                 'view_name': "shelves-api:shelf-detail",
@@ -383,9 +453,7 @@ class ShelfDetailSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """Validate unique together ``author`` and ``code`` fields."""
-        shelves = Shelf.objects.filter(author=self.context['request'].user)
-        instances = filter(lambda x: x != self.instance, shelves)
-        if data.get('code') in map(lambda x: x.code, instances):
+        if code_exists(self, data.get('code')):
             raise ValidationError(_('Shelf with this Code already exists.'))
         return data
 
@@ -398,8 +466,10 @@ class ShelfDetailSerializer(serializers.ModelSerializer):
             'cols',
             'rows',
             'nums',
+            'binders_count',
             'container_set'
         )
+        read_only_fields = ('binders_count',)
 
 
 class UploadSerializer(serializers.ModelSerializer):
@@ -408,3 +478,109 @@ class UploadSerializer(serializers.ModelSerializer):
         fields = (
             'csv_file',
         )
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+
+    url = serializers.HyperlinkedIdentityField(
+        view_name="shelves-api:upload-detail",
+    )
+    errors = serializers.ListField(source='error_list', read_only=True)
+    rows_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = (
+            'url',
+            'id',
+            'status',
+            'rows',
+            'rows_per_second',
+            'customers_created',
+            'customers_skipped',
+            'errors',
+            'queued',
+            'started',
+            'finished'
+        )
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+
+    url = serializers.HyperlinkedIdentityField(
+        view_name="shelves-api:attachment-upload-detail",
+        lookup_field='uuid',
+    )
+    part_size = serializers.SerializerMethodField()
+    parts = serializers.SerializerMethodField()
+
+    def get_part_size(self, obj):
+        return settings.SHELVES_UPLOAD_PART_SIZE
+
+    def get_parts(self, obj):
+        """Get the received parts, to resume the upload."""
+        return [
+            {'number': number, 'size': size, 'sha256': sha256}
+            for number, size, sha256 in obj.attachmentuploadpart_set.order_by(
+                'number').values_list('number', 'size', 'sha256')
+        ]
+
+    def validate_size(self, value):
+        limit = settings.SHELVES_UPLOAD_MAX_SIZE
+        if not 0 < value <= limit:
+            raise ValidationError(
+                _('The file size must be between 1 and {} bytes.').format(
+                    limit))
+        return value
+
+    class Meta:
+        model = AttachmentUpload
+        fields = (
+            'url',
+            'uuid',
+            'binder',
+            'title',
+            'filename',
+            'size',
+            'sha256',
+            'part_size',
+            'parts',
+            'status',
+            'error',
+            'attached',
+            'created'
+        )
+        read_only_fields = ('status', 'error', 'attached')
+
+
+class LocationLookupSerializer(serializers.Serializer):
+    """Customer codes and binder ids to locate at once."""
+    customers = serializers.ListField(
+        child=serializers.CharField(), required=False, default=list)
+    binders = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, data):
+        max_keys = settings.SHELVES_LOCATE_MAX_KEYS
+        if len(data['customers']) + len(data['binders']) > max_keys:
+            raise serializers.ValidationError(
+                _('Locate at most {} binders at once.').format(max_keys))
+        return data
+
+
+class BinderMoveSerializer(serializers.Serializer):
+    binder = serializers.IntegerField()
+    container = serializers.IntegerField()
+
+
+class BinderMovesSerializer(serializers.Serializer):
+    """Binders to move and their target containers."""
+    moves = BinderMoveSerializer(many=True)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate_moves(self, value):
+        max_binders = settings.SHELVES_MOVE_MAX_BINDERS
+        if len(value) > max_binders:
+            raise serializers.ValidationError(
+                _('Move at most {} binders at once.').format(max_binders))
+        return value
@@ -0,0 +1,71 @@
+"""Delta synchronization of the binders.
+
+The cursor is an opaque token holding the position of the client in the
+binders ordered by ``(updated, id)`` and in the deletions log ordered by
+``id``, so each sync reads only the rows changed since the previous one
+through the ``updated`` index.
+
+NOTE: ``updated`` is set when the binder is saved, not when the transaction
+commits; a client may miss a binder saved by a long transaction which
+commits after the sync, until the binder is saved again.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+
+from ..models import BinderDeletion
+
+
+def encode_cursor(updated, binder_id, deletion_id):
+    position = [updated.isoformat() if updated else None,
+                binder_id, deletion_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the ``(updated, binder_id, deletion_id)`` of a cursor."""
+    if not cursor:
+        return None, 0, 0
+    try:
+        updated, binder_id, deletion_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode()).decode())
+        return (parse_datetime(updated) if updated else None,
+                int(binder_id), int(deletion_id))
+    except (TypeError, ValueError):
+        raise ValidationError({'cursor': _('Invalid cursor.')})
+
+
+def get_changes(binders, author, cursor, limit):
+    """Return the binders changed and the binder ids deleted since
+    ``cursor``, up to ``limit`` of each, with the next cursor and whether
+    there are more changes.
+    """
+    updated, binder_id, deletion_id = decode_cursor(cursor)
+    if updated:
+        binders = binders.filter(
+            Q(updated__gt=updated) | Q(updated=updated, id__gt=binder_id))
+    changed = list(binders.order_by('updated', 'id')[:limit + 1])
+    more = len(changed) > limit
+    changed = changed[:limit]
+    if changed:
+        updated, binder_id = changed[-1].updated, changed[-1].id
+
+    deleted = list(BinderDeletion.objects.filter(
+        author=author, id__gt=deletion_id
+    ).order_by('id').values_list('id', 'binder_id')[:limit + 1])
+    more = more or len(deleted) > limit
+    deleted = deleted[:limit]
+    if deleted:
+        deletion_id = deleted[-1][0]
+
+    return {
+        'binders': changed,
+        'deleted': [i for __, i in deleted],
+        'cursor': encode_cursor(updated, binder_id, deletion_id),
+        'more': more,
+    }
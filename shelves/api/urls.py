@@ -17,6 +17,15 @@ urlpatterns = [
         'get': 'list',
         'post': 'create'
     }), name="binder-list"),
+    url(r'^binders/sync/$', views.BinderViewSet.as_view({
+        'get': 'sync',
+    }), name="binder-sync"),
+    url(r'^binders/move/$', views.BinderMoves.as_view(),
+        name="binder-move"),
+    url(r'^binders/allocate/$', views.BinderViewSet.as_view({
+        'get': 'allocate',
+        'post': 'allocate',
+    }), name="binder-allocate"),
     url(r'^binders/(?P<pk>[0-9]+)/$', views.BinderViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
@@ -31,6 +40,37 @@ urlpatterns = [
     url(r'^shelves/$', views.ShelfList.as_view(), name="shelf-list"),
     url(r'^shelves/(?P<code>[-\w]+)/$', views.ShelfDetail.as_view(),
         name="shelf-detail"),
+    url(r'^shelves/(?P<code>[-\w]+)/grid/$', views.ShelfGrid.as_view(),
+        name="shelf-grid"),
+    url(r'^shelves/(?P<code>[-\w]+)/events/$', views.ShelfEvents.as_view(),
+        name="shelf-events"),
+    url(r'^shelves/(?P<code>[-\w]+)/compact/$',
+        views.ShelfCompaction.as_view(), name="shelf-compact"),
 
-    url(r'^uploads/$', views.UploadView.as_view(), name="upload-list")
+    url(r'^attachments/uploads/$', views.AttachmentUploadList.as_view(),
+        name="attachment-upload-list"),
+    url(r'^attachments/uploads/(?P<uuid>[-\w]+)/$',
+        views.AttachmentUploadDetail.as_view(),
+        name="attachment-upload-detail"),
+    url(r'^attachments/uploads/(?P<uuid>[-\w]+)/parts/(?P<number>[0-9]+)/$',
+        views.AttachmentUploadPartView.as_view(),
+        name="attachment-upload-part"),
+    url(r'^attachments/uploads/(?P<uuid>[-\w]+)/complete/$',
+        views.AttachmentUploadComplete.as_view(),
+        name="attachment-upload-complete"),
+
+    url(r'^locations/$', views.LocationLookup.as_view(),
+        name="location-lookup"),
+    url(r'^locations/customers/(?P<code>[-\w]+)/$',
+        views.LocationByCustomer.as_view(), name="customer-location"),
+    url(r'^locations/binders/(?P<pk>[0-9]+)/$',
+        views.LocationByBinder.as_view(), name="binder-location"),
+
+    url(r'^exports/(?P<resource>customers|shelves|binders)/'
+        r'(?P<kind>csv|ndjson)/$', views.ExportView.as_view(),
+        name="export"),
+
+    url(r'^uploads/$', views.UploadView.as_view(), name="upload-list"),
+    url(r'^uploads/(?P<pk>[0-9]+)/$', views.ImportJobDetail.as_view(),
+        name="upload-detail"),
 ]
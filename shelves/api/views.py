@@ -1,13 +1,18 @@
-import operator
-from functools import reduce
+import base64
+import io
+import json
 
 from django.contrib.auth.models import User
-from django.db.models import Q
 from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 
-from rest_framework import generics, viewsets
-from rest_framework import permissions
+from rest_framework import generics, viewsets, status
+from rest_framework import permissions, renderers
 from rest_framework.decorators import api_view
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.reverse import reverse
@@ -25,14 +30,31 @@ from .serializers import (
     BinderListSerializer,
     BinderCreateRetrieveUpdateDestroySerializer,
     UploadSerializer,
+    ImportJobSerializer,
+    AttachmentUploadSerializer,
+    LocationLookupSerializer,
+    BinderMovesSerializer,
 )
 
+from .pagination import (
+    CodeCursorPagination,
+    IdCursorPagination,
+    BinderCursorPagination,
+    SearchPagination,
+)
+from .conditional import ConditionalGetMixin
+from .planner import plan_queryset
+from ..imports import queue_import
+from .sync import get_changes
+from .. import allocation, events, exports, locations, moves, uploads
+from ..search import search_binders
 from ..models import (
     Customer,
     Shelf,
     Container,
     Binder,
-    Upload,
+    ImportJob,
+    AttachmentUpload,
 )
 
 
@@ -54,9 +76,34 @@ def shelves_root(request, format=None):
     })
 
 
-class CustomerList(generics.ListCreateAPIView):
+class BulkCreateMixin(object):
+    """Create many objects at once when the payload is a list."""
+
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
+
+class AuthorMixin(object):
+    """Act for the current user, or the debugging one."""
+
+    if settings.DEBUG_USER_ID:
+        permission_classes = (permissions.AllowAny,)
+    else:
+        permission_classes = (permissions.IsAuthenticated,)
+
+    def get_author(self):
+        if settings.DEBUG_USER_ID:
+            return User.objects.get(id=settings.DEBUG_USER_ID)
+        return self.request.user
+
+
+class CustomerList(
+        ConditionalGetMixin, BulkCreateMixin, generics.ListCreateAPIView):
     # queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = CodeCursorPagination
     if settings.DEBUG_USER_ID:
         permission_classes = (permissions.AllowAny,)
     else:
@@ -76,7 +123,8 @@ class CustomerList(generics.ListCreateAPIView):
         return Customer.objects.filter(author=self.request.user)
 
 
-class CustomerDetail(generics.RetrieveUpdateDestroyAPIView):
+class CustomerDetail(
+        ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     # queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     lookup_field = 'code'
@@ -93,8 +141,9 @@ class CustomerDetail(generics.RetrieveUpdateDestroyAPIView):
         return Customer.objects.filter(author=self.request.user)
 
 
-class ShelfList(generics.ListCreateAPIView):
-    """List and create shelves.
+class ShelfList(
+        ConditionalGetMixin, BulkCreateMixin, generics.ListCreateAPIView):
+    """List and create one or many shelves.
 
     Front methods:
     - ``getShelves()``
@@ -103,6 +152,9 @@ class ShelfList(generics.ListCreateAPIView):
 
     # queryset = Shelf.objects.all()
     serializer_class = ShelfListSerializer
+    pagination_class = CodeCursorPagination
+    last_modified_fields = ('updated', 'container__binder__updated')
+    count_fields = ('pk', 'container__binder')
     if settings.DEBUG_USER_ID:
         permission_classes = (permissions.AllowAny,)
     else:
@@ -122,7 +174,8 @@ class ShelfList(generics.ListCreateAPIView):
         return Shelf.objects.filter(author=self.request.user)
 
 
-class ShelfDetail(generics.RetrieveUpdateDestroyAPIView):
+class ShelfDetail(
+        ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve update and destroy shelf.
 
     Front methods:
@@ -133,22 +186,136 @@ class ShelfDetail(generics.RetrieveUpdateDestroyAPIView):
     lookup_field = 'code'
     # queryset = Shelf.objects.all()
     serializer_class = ShelfDetailSerializer
+    last_modified_fields = (
+        'updated',
+        'container__binder__updated',
+        'container__binder__customer__updated',
+    )
+    count_fields = ('container__binder',)
+    binder_deletions = True
     if settings.DEBUG_USER_ID:
         permission_classes = (permissions.AllowAny,)
     else:
         permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        """Filter the shelf of the current user by the author."""
+        """Filter the shelf of the current user by the author.
+
+        The containers, binders and customers are fetched in bulk.
+        """
         if settings.DEBUG_USER_ID:
-            return Shelf.objects.filter(author=User.objects.get(
-                id=settings.DEBUG_USER_ID))
-        return Shelf.objects.filter(author=self.request.user)
+            queryset = Shelf.objects.filter(author_id=settings.DEBUG_USER_ID)
+        else:
+            queryset = Shelf.objects.filter(author=self.request.user)
+        return plan_queryset(queryset, self.get_serializer())
+
 
+class ShelfGrid(AuthorMixin, ConditionalGetMixin, generics.RetrieveAPIView):
+    """Retrieve the compact occupancy grid of a shelf.
+
+    The containers are listed row by row:
+
+    - ``containers``: the container ids;
+    - ``occupancy``: the base64 bitmap of the occupied containers;
+    - ``binders``: the ``[index, id, color]`` of each binder, ``index`` being
+      the position of its container.
+    """
 
-class ContainerList(generics.ListAPIView):
+    lookup_field = 'code'
+    last_modified_fields = ('updated', 'container__binder__updated')
+    count_fields = ('container__binder',)
+    binder_deletions = True
+    def get_queryset(self):
+        """Filter the shelf of the current user by the author."""
+        return Shelf.objects.filter(author=self.get_author())
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.get_queryset().filter(code=self.kwargs['code'])
+        return self.conditional(
+            queryset, self.get_grid, request, *args, **kwargs)
+
+    def get_grid(self, request, *args, **kwargs):
+        """Build the grid from one query of containers and binders."""
+        values = Container.objects.filter(
+            shelf__in=self.get_queryset().filter(code=self.kwargs['code'])
+        ).order_by('row', 'col', 'id').values_list(
+            'shelf__cols', 'shelf__rows', 'id', 'binder__id', 'binder__color')
+        containers, binders, index = [], [], {}
+        cols = rows = None
+        for cols, rows, container_id, binder_id, color in values:
+            if container_id not in index:
+                index[container_id] = len(containers)
+                containers.append(container_id)
+            if binder_id:
+                binders.append([index[container_id], binder_id, color])
+        if not containers:
+            raise Http404
+
+        occupancy = bytearray((len(containers) + 7) // 8)
+        for i, __, __ in binders:
+            occupancy[i // 8] |= 0x80 >> (i % 8)
+        return Response({
+            'code': self.kwargs['code'],
+            'cols': cols,
+            'rows': rows,
+            'containers': containers,
+            'occupancy': base64.b64encode(bytes(occupancy)).decode(),
+            'binders': binders,
+        })
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """Accept the ``EventSource`` requests; the errors are sent as JSON."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    """Ignore the client ``Accept`` header for the streamed responses."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class ShelfEvents(AuthorMixin, APIView):
+    """Stream the binder placements and removals of a shelf.
+
+    The response is a ``text/event-stream`` for ``EventSource``; each event
+    holds the ``binder``, ``container`` and ``color`` of the binder.
+
+    Front methods:
+    - ``watchShelf()``
+    """
+
+    renderer_classes = (EventStreamRenderer, renderers.JSONRenderer)
+
+    def get(self, request, code, format=None):
+        shelf = get_object_or_404(Shelf, author=self.get_author(), code=code)
+        try:
+            last_event_id = int(request.META['HTTP_LAST_EVENT_ID'])
+        except (KeyError, ValueError):
+            last_event_id = None
+        response = StreamingHttpResponse(
+            events.stream(shelf, last_event_id),
+            content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # NOTE: Disable the buffering of nginx.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ContainerList(ConditionalGetMixin, generics.ListAPIView):
     # queryset = Container.objects.all()
     serializer_class = ContainerSerializer
+    pagination_class = IdCursorPagination
+    last_modified_fields = ('binder__updated', 'binder__customer__updated')
+    count_fields = ('pk', 'binder')
     if settings.DEBUG_USER_ID:
         permission_classes = (permissions.AllowAny,)
     else:
@@ -160,14 +327,20 @@ class ContainerList(generics.ListAPIView):
 
         """
         if settings.DEBUG_USER_ID:
-            return Container.objects.filter(
+            queryset = Container.objects.filter(
                 shelf__author=User.objects.get(id=settings.DEBUG_USER_ID))
-        return Container.objects.filter(shelf__author=self.request.user)
+        else:
+            queryset = Container.objects.filter(
+                shelf__author=self.request.user)
+        return plan_queryset(queryset, self.get_serializer())
 
 
-class ContainerDetail(generics.RetrieveAPIView):
+class ContainerDetail(ConditionalGetMixin, generics.RetrieveAPIView):
     # queryset = Container.objects.all()
     serializer_class = ContainerSerializer
+    last_modified_fields = ('binder__updated', 'binder__customer__updated')
+    count_fields = ('pk', 'binder')
+    binder_deletions = True
     if settings.DEBUG_USER_ID:
         permission_classes = (permissions.AllowAny,)
     else:
@@ -178,23 +351,35 @@ class ContainerDetail(generics.RetrieveAPIView):
         shelf.
         """
         if settings.DEBUG_USER_ID:
-            return Container.objects.filter(
+            queryset = Container.objects.filter(
                 shelf__author=User.objects.get(id=settings.DEBUG_USER_ID))
-        return Container.objects.filter(shelf__author=self.request.user)
+        else:
+            queryset = Container.objects.filter(
+                shelf__author=self.request.user)
+        return plan_queryset(queryset, self.get_serializer())
 
 
-class BinderViewSet(viewsets.ModelViewSet):
+class BinderViewSet(
+        AuthorMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """Binder view set based on different serializers."""
 
     # queryset = Binder.objects.all()
     # serializer_class = BinderSerializer
-    if settings.DEBUG_USER_ID:
-        permission_classes = (permissions.AllowAny,)
-    else:
-        permission_classes = (permissions.IsAuthenticated,)
+    last_modified_fields = ('updated', 'customer__updated')
+    binder_deletions = True
+
+    @property
+    def paginator(self):
+        """Paginate by cursor, but the search results ordered by rank."""
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('q'):
+                self._paginator = SearchPagination()
+            else:
+                self._paginator = BinderCursorPagination()
+        return self._paginator
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'sync'):
             return BinderListSerializer
         else:
             return BinderCreateRetrieveUpdateDestroySerializer
@@ -212,41 +397,241 @@ class BinderViewSet(viewsets.ModelViewSet):
         # print(self.action)
         # print('\033[0m')
 
-        if settings.DEBUG_USER_ID:
-            user = User.objects.get(id=settings.DEBUG_USER_ID)
-        else:
-            user = self.request.user
-        queryset = Binder.objects.filter(container__shelf__author=user)
+        queryset = Binder.objects.filter(
+            container__shelf__author=self.get_author())
 
         if self.action == 'list':
             # Filtering against query parameters
             # http://www.django-rest-framework.org/api-guide/filtering/#filtering-against-query-parameters
             query = self.request.query_params.get('q', None)
             if query is not None:
-                query_list = query.split()
-                # TODO: DRY because of ``BinderListView`` queryset.
-                queryset = queryset.filter(
-                    reduce(
-                        operator.and_,
-                        (Q(title__icontains=q) for q in query_list)
-                    ) | reduce(
-                        operator.and_,
-                        (Q(content__icontains=q) for q in query_list)
-                    ) | reduce(
-                        operator.and_,
-                        (Q(customer__code__icontains=q) for q in query_list)
-                    ) | reduce(
-                        operator.and_,
-                        (Q(customer__name__icontains=q) for q in query_list)
-                    )
-                )
-
-        return queryset
+                queryset = search_binders(queryset, query)
+
+        return plan_queryset(queryset, self.get_serializer())
+
+    def sync(self, request, *args, **kwargs):
+        """List the binders changed since the ``cursor`` query parameter.
+
+        Return the changed binders, the ids of the deleted ones and the
+        cursor of the next sync. Without a cursor every binder is changed.
+        """
+        author = self.get_author()
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            limit = 100
+        changes = get_changes(
+            self.get_queryset(), author,
+            request.query_params.get('cursor'), max(limit, 1))
+        changes['binders'] = self.get_serializer(
+            changes['binders'], many=True).data
+        return Response(changes)
+
+    def allocate(self, request, *args, **kwargs):
+        """Suggest the best free containers or create a binder in the best
+        one.
+
+        The ``shelf`` query parameters are the preferred shelf codes. The
+        ``customer`` query parameter is the code of the customer of the new
+        binder when suggesting; when creating, the customer of the binder.
+        """
+        author = self.get_author()
+        shelves = request.query_params.getlist('shelf')
+        if request.method == 'GET':
+            return Response({'containers': allocation.suggest(
+                author, request.query_params.get('customer'), shelves)})
+
+        data = request.data.copy()
+        with transaction.atomic():
+            try:
+                customer = Customer.objects.filter(
+                    author=author, pk=data.get('customer') or None).first()
+                container = allocation.reserve(
+                    author, customer.code if customer else None, shelves)
+            except DjangoValidationError as e:
+                return Response({'detail': e.messages}, status=400)
+            data['container'] = container.pk
+            serializer = self.get_serializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class LocationByCustomer(AuthorMixin, APIView):
+    """Locate the binder of a customer by code."""
+
+    def get(self, request, code):
+        location, = locations.locate(
+            self.get_author(), customers=[code])[0].values()
+        if location is None:
+            raise Http404
+        return Response(location)
+
+
+class LocationByBinder(AuthorMixin, APIView):
+    """Locate a binder by id."""
+
+    def get(self, request, pk):
+        location, = locations.locate(
+            self.get_author(), binders=[int(pk)])[1].values()
+        if location is None:
+            raise Http404
+        return Response(location)
+
+
+class LocationLookup(AuthorMixin, APIView):
+    """Locate many binders at once, e.g. for a barcode scanner.
+
+    Post ``{"customers": [code, ...], "binders": [id, ...]}`` and get the
+    location of each key, ``null`` when unknown.
+    """
+
+    def post(self, request):
+        serializer = LocationLookupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        customers, binders = locations.locate(
+            self.get_author(), **serializer.validated_data)
+        return Response({'customers': customers, 'binders': binders})
+
+
+class BinderMoves(AuthorMixin, APIView):
+    """Move many binders at once.
+
+    Post ``{"moves": [{"binder": id, "container": id}, ...]}``, with
+    ``"dry_run": true`` to validate the plan without applying it.
+    """
+
+    def post(self, request):
+        serializer = BinderMovesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pairs = [(move['binder'], move['container'])
+                 for move in serializer.validated_data['moves']]
+        try:
+            plan = moves.plan_moves(self.get_author(), pairs)
+        except DjangoValidationError as e:
+            return Response({'detail': e.messages}, status=400)
+        return self.apply(plan, serializer.validated_data['dry_run'])
+
+    def apply(self, plan, dry_run=False):
+        if not dry_run:
+            moves.apply_moves(plan)
+        return Response({
+            'moves': [[move.binder, move.source, move.target]
+                      for move in plan],
+            'applied': not dry_run,
+        })
+
+
+class ShelfCompaction(BinderMoves):
+    """Pack the binders of a shelf in its first containers, row by row.
+
+    Post ``{"dry_run": true}`` to get the moves without applying them.
+    """
+
+    def post(self, request, code):
+        shelf = get_object_or_404(Shelf, author=self.get_author(), code=code)
+        try:
+            plan = moves.plan_compaction(shelf)
+        except DjangoValidationError as e:
+            return Response({'detail': e.messages}, status=400)
+        return self.apply(plan, request.data.get('dry_run') in (True, 'true'))
+
+
+class ExportView(AuthorMixin, APIView):
+    """Stream the customers, shelves or binders of the user as CSV or
+    NDJSON.
+    """
+
+    # NOTE: The response is streamed, whatever the ``Accept`` header.
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request, resource, kind):
+        response = StreamingHttpResponse(
+            exports.export(resource, self.get_author(), kind),
+            content_type=exports.FORMATS[kind])
+        response['Content-Disposition'] = \
+            'attachment; filename="{}.{}"'.format(resource, kind)
+        return response
+
+
+class AttachmentUploadList(AuthorMixin, generics.CreateAPIView):
+    """Initiate the resumable upload of a binder attachment.
+
+    Then ``PUT`` the parts to ``parts/<number>/``, with an optional
+    ``X-Checksum-SHA256`` header, and ``POST`` to ``complete/``.
+    """
+
+    serializer_class = AttachmentUploadSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        """Attach files to the binders of the current user only."""
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.fields['binder'].queryset = Binder.objects.filter(
+            container__shelf__author=self.get_author())
+        return serializer
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.get_author())
+
+
+class AttachmentUploadMixin(AuthorMixin):
+    serializer_class = AttachmentUploadSerializer
+    lookup_field = 'uuid'
+
+    def get_queryset(self):
+        """Filter the uploads of the current user by the author."""
+        return AttachmentUpload.objects.filter(author=self.get_author())
+
+
+class AttachmentUploadDetail(
+        AttachmentUploadMixin, generics.RetrieveDestroyAPIView):
+    """Retrieve the received parts or abort an attachment upload."""
+
+    def perform_destroy(self, instance):
+        uploads.abort(instance)
+
+
+class AttachmentUploadPartView(
+        AttachmentUploadMixin, generics.GenericAPIView):
+    """Store a part of an attachment upload from the raw request body."""
+
+    def put(self, request, uuid, number, format=None):
+        upload = self.get_object()
+        try:
+            part = uploads.save_part(
+                upload, int(number), request.stream or io.BytesIO(),
+                request.META.get('HTTP_X_CHECKSUM_SHA256', ''))
+        except DjangoValidationError as e:
+            return Response({'detail': e.messages}, status=400)
+        return Response({
+            'number': part.number,
+            'size': part.size,
+            'sha256': part.sha256
+        })
+
+
+class AttachmentUploadComplete(
+        AttachmentUploadMixin, generics.GenericAPIView):
+    """Queue the join of the parts of an attachment upload.
+
+    ``./manage.py runuploads`` creates the attachment; poll the upload
+    until its ``status`` is ``done`` and read the ``attached`` id.
+    """
+
+    def post(self, request, uuid, format=None):
+        upload = self.get_object()
+        try:
+            upload = uploads.queue_completion(upload)
+        except DjangoValidationError as e:
+            return Response({'detail': e.messages}, status=400)
+        return Response(
+            self.get_serializer(upload).data, status=status.HTTP_202_ACCEPTED)
 
 
 class UserList(generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = IdCursorPagination
     permission_classes = (permissions.IsAdminUser,)
 
 
@@ -260,8 +645,12 @@ class UserDetail(generics.RetrieveAPIView):
 # https://stackoverflow.com/questions/37987188/
 # Using APIView
 # https://stackoverflow.com/questions/39887923/
-class UploadView(APIView):
-    """
+class UploadView(AuthorMixin, APIView):
+    """Queue the import of a CSV file.
+
+    The customers are created by ``./manage.py runimports``; follow the
+    returned URL for the progress of the job.
+
     NOTE: Use only `Authorization` header in Postman.
 
     """
@@ -271,10 +660,28 @@ class UploadView(APIView):
     def post(self, request, format=None):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            my_file = Upload(**serializer.validated_data)
-            my_file.save()
-            # TODO: Read CSV.
-            # https://stackoverflow.com/questions/34832403/
-            return Response({'success': 'Imported successfully'})
+            upload = serializer.save()
+            job, queued = queue_import(upload, self.get_author())
+            if not queued:
+                # NOTE: Identical to a file being imported.
+                upload.delete()
+            return Response({
+                'id': job.id,
+                'url': reverse(
+                    'shelves-api:upload-detail', kwargs={'pk': job.id},
+                    request=request, format=format),
+                'duplicate': not queued
+            }, status=(
+                status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK))
         else:
             return Response(serializer.errors, status=400)
+
+
+class ImportJobDetail(AuthorMixin, generics.RetrieveAPIView):
+    """Report the progress of an import job."""
+
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        """Filter the import jobs of the current user by the author."""
+        return ImportJob.objects.filter(author=self.get_author())
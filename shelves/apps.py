@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ShelvesConfig(AppConfig):
     name = 'shelves'
+
+    def ready(self):
+        from . import signals  # noqa: F401
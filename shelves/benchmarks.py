@@ -0,0 +1,354 @@
+"""Benchmark the endpoints of the shelves API.
+
+Each endpoint of ``shelves/api/urls.py`` is requested through the whole
+middleware stack by the test client, as an author of a dataset made by
+``./manage.py gendata``. The benchmark runs in a transaction rolled back at
+the end and each request in a savepoint rolled back after it, so the
+writing endpoints leave the dataset as it was. The files they write in the
+storage are deleted after the rollback.
+
+The results are keyed by request, so two runs compare line by line:
+
+- ``latency_ms``: the minimum, median and 95th percentile of the runs;
+- ``queries``: the SQL queries of one run, savepoints excluded;
+- ``memory_kb``: the peak of the Python allocations of one run;
+- ``status`` and ``bytes`` of the response.
+"""
+import hashlib
+import io
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+
+from django import get_version
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import uploads
+from .api import urls as api_urls
+from .imports import queue_import
+from .queries import get_queries
+from .models import (
+    Customer,
+    Shelf,
+    Binder,
+    Upload,
+    AttachmentUpload,
+    AttachmentUploadPart,
+    Blob,
+)
+from .storage import BLOBS_LOCATION, delete_files
+
+NAMESPACE = 'shelves-api'
+PART = b'Benchmark part'
+
+
+class BenchmarkRequest:
+    """A request of the benchmark.
+
+    ``data`` may be a callable, called for each run, for the bodies that
+    can't be sent twice such as files.
+    """
+
+    def __init__(self, key, method, name, kwargs=None, data=None,
+                 content_type='application/json', query=''):
+        self.key = key
+        self.method = method
+        self.name = name
+        self.path = reverse(
+            '{}:{}'.format(NAMESPACE, name), kwargs=kwargs) + query
+        self.data = data
+        self.content_type = content_type
+
+    def send(self, client):
+        """Send the request, read the whole response and return it with its
+        size.
+        """
+        data = self.data() if callable(self.data) else self.data
+        if self.method == 'get':
+            response = client.get(self.path)
+        elif self.content_type is None:
+            response = getattr(client, self.method)(self.path, data)
+        else:
+            if self.content_type == 'application/json':
+                data = json.dumps(data) if data is not None else ''
+            response = getattr(client, self.method)(
+                self.path, data, content_type=self.content_type)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return response, size
+
+
+def create_fixtures(author):
+    """Create the objects the detail endpoints need, besides the dataset."""
+    upload = Upload.objects.create(csv_file=SimpleUploadedFile(
+        'benchmark.csv', b'code,name\nbenchmark,Benchmark\n'))
+    job, __ = queue_import(upload, author)
+    binder = Binder.objects.filter(
+        container__shelf__author=author).order_by('id').first()
+    attachment_upload = AttachmentUpload.objects.create(
+        binder=binder, author=author, title='Benchmark',
+        filename='benchmark.txt', size=len(PART),
+        sha256=hashlib.sha256(PART).hexdigest())
+    # NOTE: The only part, sent again by the benchmark.
+    uploads.save_part(attachment_upload, 1, io.BytesIO(PART))
+    return job, attachment_upload
+
+
+def get_requests(author, job, attachment_upload):
+    """Return the ``BenchmarkRequest`` of the endpoints for ``author``."""
+    shelf = Shelf.objects.filter(
+        author=author, binders_count__gt=0).order_by('id').first()
+    binders = Binder.objects.filter(
+        container__shelf=shelf, customer__isnull=False
+    ).select_related('customer', 'container').order_by('id')
+    binder = binders.first()
+    codes = list(Customer.objects.filter(
+        author=author).order_by('code').values_list('code', flat=True)[:100])
+    free = shelf.container_set.filter(binders_count=0).first()
+    word = binder.title.split()[0]
+
+    def csv_file():
+        return {'csv_file': SimpleUploadedFile(
+            'bench.csv', b'code,name\nbench,Bench\n')}
+
+    return [
+        BenchmarkRequest('GET user-list', 'get', 'user-list'),
+        BenchmarkRequest(
+            'GET user-detail', 'get', 'user-detail', {'pk': author.pk}),
+        BenchmarkRequest('GET customer-list', 'get', 'customer-list'),
+        BenchmarkRequest(
+            'POST customer-list', 'post', 'customer-list',
+            data={'code': 'benchmark', 'name': 'Benchmark'}),
+        BenchmarkRequest(
+            'GET customer-detail', 'get', 'customer-detail',
+            {'code': binder.customer.code}),
+        BenchmarkRequest('GET binder-list', 'get', 'binder-list'),
+        BenchmarkRequest(
+            'GET binder-list search', 'get', 'binder-list',
+            query='?q={}'.format(word)),
+        BenchmarkRequest(
+            'POST binder-list', 'post', 'binder-list',
+            data={'title': 'Benchmark', 'container': binder.container_id}),
+        BenchmarkRequest('GET binder-sync', 'get', 'binder-sync'),
+        BenchmarkRequest(
+            'POST binder-move', 'post', 'binder-move', data={'moves': [
+                {'binder': binder.id, 'container': free.id}
+            ] if free else []}),
+        BenchmarkRequest(
+            'GET binder-allocate', 'get', 'binder-allocate',
+            query='?customer={}'.format(binder.customer.code)),
+        BenchmarkRequest(
+            'POST binder-allocate', 'post', 'binder-allocate',
+            data={'title': 'Benchmark'}),
+        BenchmarkRequest(
+            'GET binder-detail', 'get', 'binder-detail', {'pk': binder.id}),
+        BenchmarkRequest(
+            'PUT binder-detail', 'put', 'binder-detail', {'pk': binder.id},
+            data={'title': 'Benchmark', 'container': binder.container_id}),
+        BenchmarkRequest(
+            'DELETE binder-detail', 'delete', 'binder-detail',
+            {'pk': binder.id}),
+        BenchmarkRequest('GET container-list', 'get', 'container-list'),
+        BenchmarkRequest(
+            'GET container-detail', 'get', 'container-detail',
+            {'pk': binder.container_id}),
+        BenchmarkRequest('GET shelf-list', 'get', 'shelf-list'),
+        BenchmarkRequest(
+            'GET shelf-detail', 'get', 'shelf-detail', {'code': shelf.code}),
+        BenchmarkRequest(
+            'GET shelf-grid', 'get', 'shelf-grid', {'code': shelf.code}),
+        BenchmarkRequest(
+            'GET shelf-events', 'get', 'shelf-events', {'code': shelf.code}),
+        BenchmarkRequest(
+            'POST shelf-compact', 'post', 'shelf-compact',
+            {'code': shelf.code}, data={}),
+        BenchmarkRequest(
+            'POST attachment-upload-list', 'post', 'attachment-upload-list',
+            data={'binder': binder.id, 'title': 'Benchmark',
+                  'filename': 'benchmark.txt', 'size': 1}),
+        BenchmarkRequest(
+            'GET attachment-upload-detail', 'get',
+            'attachment-upload-detail', {'uuid': attachment_upload.uuid}),
+        BenchmarkRequest(
+            'PUT attachment-upload-part', 'put', 'attachment-upload-part',
+            {'uuid': attachment_upload.uuid, 'number': 1}, data=PART,
+            content_type='application/octet-stream'),
+        BenchmarkRequest(
+            'POST attachment-upload-complete', 'post',
+            'attachment-upload-complete', {'uuid': attachment_upload.uuid}),
+        BenchmarkRequest(
+            'POST location-lookup', 'post', 'location-lookup',
+            data={'customers': codes}),
+        BenchmarkRequest(
+            'GET customer-location', 'get', 'customer-location',
+            {'code': binder.customer.code}),
+        BenchmarkRequest(
+            'GET binder-location', 'get', 'binder-location',
+            {'pk': binder.id}),
+        BenchmarkRequest(
+            'GET export customers csv', 'get', 'export',
+            {'resource': 'customers', 'kind': 'csv'}),
+        BenchmarkRequest(
+            'GET export binders ndjson', 'get', 'export',
+            {'resource': 'binders', 'kind': 'ndjson'}),
+        BenchmarkRequest(
+            'POST upload-list', 'post', 'upload-list', data=csv_file,
+            content_type=None),
+        BenchmarkRequest(
+            'GET upload-detail', 'get', 'upload-detail', {'pk': job.id}),
+    ]
+
+
+def get_missing(requests):
+    """Return the names of the endpoints without benchmark."""
+    names = {request.name for request in requests}
+    return sorted(
+        pattern.name for pattern in api_urls.urlpatterns
+        if pattern.name and pattern.name not in names)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def get_files():
+    """Return the names of the blobs and of the upload parts."""
+    return (
+        set(Blob.objects.values_list('name', flat=True)) |
+        set(AttachmentUploadPart.objects.values_list('file', flat=True)))
+
+
+@contextmanager
+def cleanup_files():
+    """Delete the files written by the rolled back block.
+
+    The savepoints roll back the rows only, so the files of the blobs and
+    parts created by the block, and gone after it, are deleted.
+    """
+    before = get_files()
+    written = set()
+    try:
+        yield written
+    finally:
+        for name in written - before - get_files():
+            if name.startswith(BLOBS_LOCATION + '/'):
+                delete_files(name)
+            else:
+                default_storage.delete(name)
+
+
+@contextmanager
+def trace_memory(peak):
+    """Append the peak of the Python allocations of the block to ``peak``."""
+    tracemalloc.start()
+    try:
+        yield
+        peak.append(tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+
+def run(client, request, *contexts):
+    """Send ``request`` in a rolled back savepoint within ``contexts``.
+
+    Return the response, its size and the latency in milliseconds.
+    """
+    with cleanup_files() as written, transaction.atomic():
+        with ExitStack() as stack:
+            for context in contexts:
+                stack.enter_context(context)
+            start = time.perf_counter()
+            response, size = request.send(client)
+            latency = (time.perf_counter() - start) * 1000
+        written.update(get_files())
+        transaction.set_rollback(True)
+    return response, size, latency
+
+
+def measure(client, request, repeat):
+    """Return the measures of ``request``, run ``repeat`` times."""
+    run(client, request)
+    latencies = [run(client, request)[2] for __ in range(repeat)]
+    with CaptureQueriesContext(connection) as context:
+        response, size, __ = run(client, request, context)
+    peaks = []
+    run(client, request, trace_memory(peaks))
+    peak = peaks[0]
+    return {
+        'method': request.method.upper(),
+        'path': request.path,
+        'status': response.status_code,
+        'bytes': size,
+        'latency_ms': {
+            'min': round(min(latencies), 3),
+            'median': round(statistics.median(latencies), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+        },
+        'queries': len(get_queries(context.captured_queries)),
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(author, repeat=10, keys=None):
+    """Benchmark the endpoints as ``author`` and return the results."""
+    client = Client()
+    client.force_login(author)
+    results = {}
+    # NOTE: The debugging user, if any, is the author; the event streams
+    # close at once.
+    debug_user_id = author.pk if settings.DEBUG_USER_ID else 0
+    with override_settings(
+            DEBUG_USER_ID=debug_user_id, SHELVES_EVENTS_TIMEOUT=0):
+        with cleanup_files() as written, transaction.atomic():
+            job, attachment_upload = create_fixtures(author)
+            written.update(get_files())
+            requests = get_requests(author, job, attachment_upload)
+            for request in requests:
+                if keys and request.key not in keys:
+                    continue
+                results[request.key] = measure(client, request, repeat)
+            transaction.set_rollback(True)
+    return {
+        'meta': {
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': get_version(),
+            'database': connection.vendor,
+            'author': author.username,
+            'dataset': {
+                'shelves': Shelf.objects.filter(author=author).count(),
+                'binders': Binder.objects.filter(
+                    container__shelf__author=author).count(),
+                'customers': Customer.objects.filter(author=author).count(),
+            },
+            'repeat': repeat,
+            'missing': get_missing(requests),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """Yield ``(key, median ratio, queries delta)`` of the requests of both
+    results, a ratio above 1 being slower.
+    """
+    for key, result in sorted(current['results'].items()):
+        previous = baseline['results'].get(key)
+        if not previous:
+            continue
+        before = previous['latency_ms']['median']
+        ratio = result['latency_ms']['median'] / before if before else None
+        yield key, ratio, result['queries'] - previous['queries']
@@ -0,0 +1,75 @@
+"""Server-sent events of the binder placements and removals.
+
+The binder signals publish the events in the ``ShelfEvent`` table, which
+works as a pub/sub shared by every web worker. The stream of a shelf is a
+long poll: it polls the table by primary key and closes as soon as it has
+sent events, or after ``SHELVES_EVENTS_TIMEOUT`` seconds without any; the
+``EventSource`` of the browser then reconnects with the ``Last-Event-ID``
+header and resumes where it stopped.
+
+Each open stream still holds a worker of a synchronous server (e.g. the
+sync workers of gunicorn) for up to the timeout, but not a database
+connection, which is closed between the polls. Serve many viewers with
+asynchronous workers (gevent) or size the pool for them.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+
+from .models import Container, ShelfEvent
+
+# NOTE: Comment lines keep the proxies from closing idle connections.
+KEEP_ALIVE = 15
+
+
+def publish(kind, binder, container_id):
+    """Publish a binder event on the shelf of the container."""
+    shelf_id = Container.objects.filter(
+        pk=container_id).values_list('shelf', flat=True).first()
+    if shelf_id:
+        ShelfEvent.objects.create(
+            shelf_id=shelf_id, kind=kind, binder_id=binder.pk,
+            container_id=container_id, color=binder.color)
+
+
+def format_event(event):
+    data = {
+        'binder': event.binder_id,
+        'container': event.container_id,
+        'color': event.color,
+    }
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        event.id, event.kind, json.dumps(data))
+
+
+def stream(shelf, last_event_id=None):
+    """Yield the events of ``shelf`` after ``last_event_id``, then stop.
+
+    Without ``last_event_id`` only the upcoming events are streamed.
+    """
+    interval = settings.SHELVES_EVENTS_INTERVAL
+    events = ShelfEvent.objects.filter(shelf=shelf).order_by('id')
+    if last_event_id is None:
+        last_event_id = events.aggregate(last=Max('id'))['last'] or 0
+    deadline = time.time() + settings.SHELVES_EVENTS_TIMEOUT
+    alive = time.time()
+
+    yield 'retry: {}\n\n'.format(int(interval * 1000))
+    while True:
+        batch = list(events.filter(id__gt=last_event_id)[:100])
+        # NOTE: Release the connection while waiting, unless in a test.
+        if not connection.in_atomic_block:
+            connection.close()
+        if batch:
+            for event in batch:
+                yield format_event(event)
+            return
+        if time.time() >= deadline:
+            return
+        if time.time() - alive > KEEP_ALIVE:
+            alive = time.time()
+            yield ': keep-alive\n\n'
+        time.sleep(interval)
@@ -0,0 +1,88 @@
+"""Export customers, shelves and binders as CSV or NDJSON.
+
+The rows are read as tuples by primary key chunks and encoded one by one,
+so the memory stays flat whatever the number of exported rows.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Customer, Shelf, Binder
+
+# Resource: (model, author lookup, ((column, field), ...))
+RESOURCES = {
+    'customers': (Customer, 'author', (
+        ('code', 'code'),
+        ('name', 'name'),
+        ('note', 'note'),
+    )),
+    'shelves': (Shelf, 'author', (
+        ('code', 'code'),
+        ('name', 'name'),
+        ('desc', 'desc'),
+        ('cols', 'cols'),
+        ('rows', 'rows'),
+        ('nums', 'nums'),
+        ('binders_count', 'binders_count'),
+    )),
+    'binders': (Binder, 'container__shelf__author', (
+        ('id', 'id'),
+        ('title', 'title'),
+        ('color', 'color'),
+        ('content', 'content'),
+        ('customer', 'customer__code'),
+        ('shelf', 'container__shelf__code'),
+        ('container', 'container'),
+        ('col', 'container__col'),
+        ('row', 'container__row'),
+        ('updated', 'updated'),
+    )),
+}
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """The file-like interface of ``csv.writer`` returning the lines.
+
+    .. _Streaming large CSV files:
+        https://docs.djangoproject.com/en/1.10/howto/outputting-csv/#streaming-large-csv-files
+
+    """
+
+    def write(self, value):
+        return value
+
+
+def get_rows(resource, author, chunk_size=CHUNK_SIZE):
+    """Yield the rows of ``resource`` of ``author`` as tuples."""
+    model, lookup, columns = RESOURCES[resource]
+    fields = [field for __, field in columns]
+    queryset = model.objects.filter(**{lookup: author}).order_by('pk')
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(chunk.values_list('pk', *fields)[:chunk_size].iterator())
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+
+def export(resource, author, format='csv'):
+    """Yield the lines of the export of ``resource`` in ``format``."""
+    columns = [column for column, __ in RESOURCES[resource][2]]
+    rows = get_rows(resource, author)
+    if format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(columns, row))) + '\n'
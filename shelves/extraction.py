@@ -0,0 +1,126 @@
+"""Text extraction of the binder attachments.
+
+The text of the PDF, CSV and plain text attachments is extracted in the
+background by ``./manage.py runextractions``, stored with the attachment and
+added to the search index of its binder, so the search never reads the
+files. The PDF files need ``pdftotext`` (poppler-utils).
+"""
+import codecs
+import csv
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+
+from . import search
+from .models import Binder, Attached
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = ('.txt', '.text', '.md', '.rst')
+CSV_EXTENSIONS = ('.csv',)
+PDF_EXTENSIONS = ('.pdf',)
+PDF_TIMEOUT = 60
+
+
+class UnsupportedFile(Exception):
+    """The file type has no text."""
+
+
+def read_text(field_file, max_length):
+    """Return up to ``max_length`` characters of a text file."""
+    field_file.open('rb')
+    try:
+        # NOTE: Undecodable bytes are replaced instead of failing the file.
+        reader = codecs.getreader('utf-8-sig')(field_file, errors='replace')
+        return reader.read(chars=max_length)
+    finally:
+        field_file.close()
+
+
+def read_csv(field_file, max_length):
+    """Return up to ``max_length`` characters of the cells of a CSV file."""
+    text = read_text(field_file, max_length)
+    return '\n'.join(' '.join(row) for row in csv.reader(text.splitlines()))
+
+
+def read_pdf(field_file, max_length):
+    """Return up to ``max_length`` characters of the text of a PDF file."""
+    pdftotext = shutil.which('pdftotext')
+    if not pdftotext:
+        raise UnsupportedFile('pdftotext is not installed.')
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+        field_file.open('rb')
+        try:
+            for chunk in field_file.chunks():
+                f.write(chunk)
+        finally:
+            field_file.close()
+        f.flush()
+        output = subprocess.check_output(
+            [pdftotext, '-enc', 'UTF-8', f.name, '-'], timeout=PDF_TIMEOUT)
+    return output.decode('utf-8', 'replace')[:max_length]
+
+
+def extract(field_file, max_length):
+    """Return the text of ``field_file``."""
+    extension = os.path.splitext(field_file.name)[1].lower()
+    if extension in TEXT_EXTENSIONS:
+        reader = read_text
+    elif extension in CSV_EXTENSIONS:
+        reader = read_csv
+    elif extension in PDF_EXTENSIONS:
+        reader = read_pdf
+    else:
+        raise UnsupportedFile(extension)
+    return reader(field_file, max_length)
+
+
+def extract_text(attached, max_length=None):
+    """Store the text of ``attached``, index its binder and return the
+    extraction status.
+    """
+    max_length = max_length or settings.SHELVES_TEXT_MAX_LENGTH
+    name = attached.file.name
+    text = ''
+    status = Attached.DONE
+    try:
+        # NOTE: PostgreSQL text can't store NUL characters.
+        text = extract(attached.file, max_length).replace('\x00', ' ')
+    except UnsupportedFile:
+        status = Attached.UNSUPPORTED
+    except Exception:
+        logger.exception('Text of attachment %s failed.', attached.pk)
+        status = Attached.FAILED
+    # NOTE: The file may have been replaced while extracting.
+    if Attached.objects.filter(pk=attached.pk, file=name).update(
+            text=text, text_status=status) and text:
+        binder = Binder.objects.select_related('customer').filter(
+            pk=attached.binder_id).first()
+        if binder:
+            search.index_binder(binder)
+    attached.text, attached.text_status = text, status
+    return status
+
+
+def claim_attachments(limit):
+    """Claim up to ``limit`` attachments pending a text extraction."""
+    return Attached.claim_pending('text_status', limit)
+
+
+def process_attachment(pk):
+    """Extract the text of the attachment ``pk`` in a worker thread and
+    return its status.
+    """
+    try:
+        attached = Attached.objects.get(pk=pk)
+    except Attached.DoesNotExist:
+        return None
+    else:
+        return extract_text(attached)
+    finally:
+        connection.close()
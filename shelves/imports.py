@@ -0,0 +1,207 @@
+"""Import customers from the CSV files of ``Upload``.
+
+The file is streamed from the storage, so it works on the local file system
+as well as on S3, and the customers are created in chunks within a single
+transaction: either every valid row is imported or none.
+
+The imports run in the background as ``ImportJob``, processed by
+``./manage.py runimports``.
+"""
+import codecs
+import csv
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+
+from .models import Customer, ImportJob
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('code', 'name', 'note')
+REQUIRED_FIELDS = ('code',)
+
+
+class ImportReport:
+    """The outcome of an import.
+
+    ``errors`` is a list of ``(line, messages)`` tuples, the line number
+    counting the header as the first line.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+
+    def __str__(self):
+        return _(
+            '{} rows: {} created, {} already existing, {} errors.'
+        ).format(self.rows, self.created, self.skipped, len(self.errors))
+
+
+def read_rows(field_file):
+    """Yield the CSV rows of a storage file as lists of strings."""
+    field_file.open('rb')
+    try:
+        # NOTE: The ``utf-8-sig`` codec drops the BOM written by Excel.
+        lines = codecs.iterdecode(field_file, 'utf-8-sig')
+        for row in csv.reader(lines):
+            yield row
+    finally:
+        field_file.close()
+
+
+def get_mapping(header):
+    """Map the model fields to the column indexes of the header.
+
+    The column names may match either the field names or their
+    translations.
+    """
+    columns = [column.strip().lower() for column in header]
+    mapping = {}
+    for field in FIELDS:
+        for name in (field, _(field).lower()):
+            if name in columns:
+                mapping[field] = columns.index(name)
+                break
+    missing = [field for field in REQUIRED_FIELDS if field not in mapping]
+    if missing:
+        raise ValidationError(
+            _('Is the field {} present in the CSV file header?').format(
+                ', '.join(missing)),
+            code='key'
+        )
+    return mapping
+
+
+def import_customers(upload, author, chunk_size=None, report=None):
+    """Create the customers of ``upload`` for ``author``.
+
+    Rows with a code already used by the author are skipped; invalid rows
+    are reported and skipped. Return an ``ImportReport``, updated while the
+    import goes on if given.
+    """
+    chunk_size = chunk_size or settings.SHELVES_IMPORT_CHUNK_SIZE
+    report = report or ImportReport()
+    rows = read_rows(upload.csv_file)
+    try:
+        mapping = get_mapping(next(rows))
+    except StopIteration:
+        raise ValidationError(
+            _('The CSV file require a proper header in order.'),
+            code='invalid'
+        )
+
+    codes = set(
+        Customer.objects.filter(author=author).values_list('code', flat=True))
+    chunk = []
+    with transaction.atomic():
+        for line, row in enumerate(rows, start=2):
+            if not any(row):
+                continue
+            report.rows += 1
+            values = {
+                field: row[index].strip() if index < len(row) else ''
+                for field, index in mapping.items()
+            }
+            if values['code'] in codes:
+                report.skipped += 1
+                continue
+            customer = Customer(author=author, **values)
+            try:
+                customer.clean_fields(exclude=('uuid', 'author'))
+            except ValidationError as e:
+                report.errors.append((line, [
+                    '{}: {}'.format(field, ' '.join(messages))
+                    for field, messages in e.message_dict.items()
+                ]))
+                continue
+            codes.add(customer.code)
+            chunk.append(customer)
+            if len(chunk) >= chunk_size:
+                Customer.objects.bulk_create(chunk)
+                report.created += len(chunk)
+                chunk = []
+        Customer.objects.bulk_create(chunk)
+        report.created += len(chunk)
+    return report
+
+
+def queue_import(upload, author):
+    """Queue the import of ``upload`` for ``author``.
+
+    The uploads are content-addressed, so a file identical to one still
+    queued or running for the author has the same name: return that job
+    instead, with ``False`` as the second item. A file imported before may
+    be imported again, e.g. after its customers were deleted.
+    """
+    previous = ImportJob.objects.filter(
+        author=author, upload__csv_file=upload.csv_file.name,
+        status__in=(ImportJob.QUEUED, ImportJob.RUNNING),
+    ).exclude(
+        upload=upload
+    ).order_by('-id').first()
+    if previous:
+        return previous, False
+    return ImportJob.objects.create(upload=upload, author=author), True
+
+
+def claim_import_job():
+    """Mark the oldest queued job as running and return it."""
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update().filter(
+            status=ImportJob.QUEUED).order_by('id').first()
+        if job:
+            job.status = ImportJob.RUNNING
+            job.started = timezone.now()
+            job.save(update_fields=('status', 'started'))
+    return job
+
+
+def run_import_job(job, interval=1):
+    """Run the import of ``job``, saving its progress every ``interval``.
+
+    The import transaction runs in a thread with its own connection, so the
+    progress is committed and visible while the import is still running.
+    """
+    report = ImportReport()
+    failure = []
+
+    def target():
+        try:
+            import_customers(job.upload, job.author, report=report)
+        except ValidationError as e:
+            failure.extend(e.messages)
+        except Exception as e:
+            logger.exception('Import job %s failed.', job.id)
+            failure.append(str(e))
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    while thread.is_alive():
+        thread.join(interval)
+        ImportJob.objects.filter(pk=job.pk).update(rows=report.rows)
+
+    errors = [{'line': line, 'messages': messages}
+              for line, messages in report.errors]
+    if failure:
+        job.status = ImportJob.FAILED
+        errors.append({'line': None, 'messages': failure})
+    else:
+        job.status = ImportJob.DONE
+        job.customers_created = report.created
+        job.customers_skipped = report.skipped
+    job.rows = report.rows
+    job.errors = json.dumps(errors)
+    job.finished = timezone.now()
+    job.save()
+    return job
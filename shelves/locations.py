@@ -0,0 +1,82 @@
+"""Locate the binders by customer code or binder id.
+
+The location of each binder (customer code, shelf code, container, column
+and row) is copied to ``BinderLocation`` by the receivers in ``signals.py``,
+so a lookup is one indexed query on one table, whatever the number of keys
+up to the chunk size.
+"""
+from .models import Container, Binder, BinderLocation
+
+# (Model field, key of the returned location)
+FIELDS = (
+    ('binder', 'binder'),
+    ('customer_code', 'customer'),
+    ('shelf_code', 'shelf'),
+    ('container', 'container'),
+    ('col', 'col'),
+    ('row', 'row'),
+)
+CHUNK_SIZE = 500
+
+
+def locate_binder(binder):
+    """Create or update the location of ``binder``."""
+    container = Container.objects.select_related('shelf').get(
+        pk=binder.container_id)
+    customer = binder.customer
+    BinderLocation.objects.update_or_create(binder=binder, defaults={
+        'author_id': container.shelf.author_id,
+        'customer_code': customer.code if customer else '',
+        'shelf': container.shelf,
+        'shelf_code': container.shelf.code,
+        'container': container,
+        'col': container.col,
+        'row': container.row,
+    })
+
+
+def rebuild_locations(batch_size=CHUNK_SIZE):
+    """Locate every binder from scratch, e.g. after ``loaddata``."""
+    BinderLocation.objects.all().delete()
+    values = Binder.objects.values_list(
+        'id', 'container__shelf__author', 'customer__code',
+        'container__shelf', 'container__shelf__code', 'container',
+        'container__col', 'container__row')
+    locations = []
+    for binder, author, customer, shelf, code, container, col, row in \
+            values.iterator():
+        locations.append(BinderLocation(
+            binder_id=binder, author_id=author, customer_code=customer or '',
+            shelf_id=shelf, shelf_code=code, container_id=container,
+            col=col, row=row))
+        if len(locations) >= batch_size:
+            BinderLocation.objects.bulk_create(locations)
+            locations = []
+    BinderLocation.objects.bulk_create(locations)
+
+
+def get_locations(author, field, keys, chunk_size=CHUNK_SIZE):
+    """Map ``keys`` to the location of the binder of ``author`` whose
+    ``field`` equals the key, or to ``None``.
+    """
+    result = dict.fromkeys(keys)
+    keys = list(result)
+    queryset = BinderLocation.objects.filter(author=author)
+    for i in range(0, len(keys), chunk_size):
+        values = queryset.filter(
+            **{field + '__in': keys[i:i + chunk_size]}
+        ).values_list(*(model_field for model_field, __ in FIELDS))
+        for row in values:
+            location = {key: value for (__, key), value in zip(FIELDS, row)}
+            result[location[dict(FIELDS)[field]]] = location
+    return result
+
+
+def locate(author, customers=(), binders=()):
+    """Return the locations of the binders of ``author`` by customer code
+    and by binder id, as two dictionaries.
+    """
+    return (
+        get_locations(author, 'customer_code', customers),
+        get_locations(author, 'binder', binders),
+    )
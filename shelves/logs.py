@@ -0,0 +1,187 @@
+"""Queued structured logging.
+
+The request threads only put the records in a queue; a ``QueueListener``
+thread formats them as JSON lines and writes them to the handlers, e.g. a
+``RotatingFileHandler``. Everything is configured by ``LOGGING`` in the
+settings:
+
+- ``RequestLogMiddleware`` gives each request an id, answered in the
+  ``X-Request-ID`` header, and logs one record per request with its view,
+  status and duration;
+- ``RequestContextFilter`` adds the request id, user and view to the
+  records logged while the request runs;
+- ``SamplingFilter`` keeps a fraction of the debug records, all or none
+  of each request.
+"""
+import copy
+import hashlib
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger('shelves.requests')
+
+# NOTE: The attributes of every record, the others are ``extra`` fields.
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {
+    'message', 'asctime'}
+CONTEXT_FIELDS = ('request_id', 'user', 'view')
+
+_context = threading.local()
+
+
+def get_user_id(request):
+    """Return the id of the request user, without loading a lazy one."""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return getattr(user, 'pk', None)
+
+
+def get_context():
+    """Return the request id, user and view of the current request."""
+    request = getattr(_context, 'request', None)
+    if request is None:
+        return {}
+    match = request.resolver_match
+    return {
+        'request_id': request.id,
+        'user': get_user_id(request),
+        'view': match.view_name if match else None,
+    }
+
+
+class RequestContextFilter(logging.Filter):
+    """Add the context of the current request to the records."""
+
+    def filter(self, record):
+        for field, value in get_context().items():
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep ``rate`` of the records at ``level`` or below.
+
+    The records of a request are kept or dropped together.
+    """
+
+    def __init__(self, rate=1.0, level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        if isinstance(level, str):
+            level = logging.getLevelName(level)
+        self.level = level
+
+    def filter(self, record):
+        if record.levelno > self.level or self.rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id is None:
+            return random.random() < self.rate
+        digest = hashlib.md5(request_id.encode()).hexdigest()
+        return int(digest[:8], 16) / 0xffffffff < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as a line of JSON, ``extra`` fields included."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(
+                record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            data[field] = getattr(record, field, None)
+        data.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES and key not in data)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """Queue the records for the ``handlers``, written by a thread.
+
+    In ``LOGGING`` refer to the handlers with ``cfg://handlers.<name>``.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        # NOTE: Indexing the converting list resolves the configured handlers.
+        handlers = [handlers[i] for i in range(len(handlers))]
+        self.listener = QueueListener(
+            self.queue, *handlers,
+            respect_handler_level=respect_handler_level)
+        self.listener.start()
+
+    def prepare(self, record):
+        """Merge the arguments in the message but keep the exception and
+        the ``extra`` fields apart.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # NOTE: Drop the records rather than block the requests.
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def close(self):
+        # NOTE: Write the queued records, once, before the handlers close.
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+class RequestLogMiddleware:
+    """Identify and log each request.
+
+    The id comes from the ``X-Request-ID`` header of the proxy, if any.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.id = request.META.get('HTTP_X_REQUEST_ID', '')[:64] or \
+            uuid.uuid4().hex
+        _context.request = request
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            duration = time.perf_counter() - start
+            logger.info(
+                '%s %s %s', request.method, request.path,
+                response.status_code, extra={
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 3),
+                })
+            response['X-Request-ID'] = request.id
+            return response
+        finally:
+            _context.request = None
@@ -0,0 +1,73 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from shelves.benchmarks import run_benchmarks, compare
+from shelves.models import Binder
+
+
+class Command(BaseCommand):
+    """Benchmark the endpoints of the shelves API.
+
+    Generate a dataset first, then record and compare the results::
+
+        ./manage.py gendata --shelves 8 --cols 16 --rows 16
+        ./manage.py benchapi --output baseline.json
+        ./manage.py benchapi --output new.json --compare baseline.json
+
+    """
+    help = "Measure the latency, queries and memory of the API endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default='synthetic-0',
+            help="Username of the author of the benchmarked data.")
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help="Number of measured runs of each request.")
+        parser.add_argument(
+            '--only', nargs='+', metavar='KEY',
+            help="Benchmark these requests only, e.g. 'GET shelf-detail'.")
+        parser.add_argument(
+            '--output', help="Write the results to this JSON file.")
+        parser.add_argument(
+            '--compare', metavar='JSON',
+            help="Compare the results to a previous JSON file.")
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(
+                "No user {}: run ./manage.py gendata first.".format(
+                    options['user']))
+        if not Binder.objects.filter(
+                container__shelf__author=author,
+                customer__isnull=False).exists():
+            raise CommandError("The user has no binder with a customer.")
+
+        results = run_benchmarks(author, options['repeat'], options['only'])
+        self.stdout.write('{:<36} {:>6} {:>10} {:>10} {:>8} {:>10}'.format(
+            'request', 'status', 'median ms', 'p95 ms', 'queries', 'peak KiB'))
+        for key, result in sorted(results['results'].items()):
+            self.stdout.write(
+                '{:<36} {:>6} {:>10.2f} {:>10.2f} {:>8} {:>10.1f}'.format(
+                    key, result['status'], result['latency_ms']['median'],
+                    result['latency_ms']['p95'], result['queries'],
+                    result['memory_kb']))
+        if results['meta']['missing']:
+            self.stderr.write('Endpoints without benchmark: {}'.format(
+                ', '.join(results['meta']['missing'])))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            self.stdout.write('\n{:<36} {:>12} {:>8}'.format(
+                'request', 'median x', 'queries'))
+            for key, ratio, queries in compare(baseline, results):
+                self.stdout.write('{:<36} {:>12} {:>+8}'.format(
+                    key, '{:.2f}'.format(ratio) if ratio else '-', queries))
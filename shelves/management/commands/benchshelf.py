@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from shelves.models import Shelf
+
+
+class Command(BaseCommand):
+    """Measure how the shelf creation time grows with the shelf size.
+
+    Every shelf is created in a transaction that is rolled back afterwards,
+    so the command leaves the database untouched::
+
+        ./manage.py benchshelf --sizes 16 256 1024 4096
+
+    """
+    help = "Benchmark the creation of shelves of increasing size."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[16, 64, 256, 1024, 4096],
+            help="Number of containers for each benchmarked shelf.")
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help="Number of runs for each size; the best one is reported.")
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>8} {:>12} {:>16}'.format(
+            'size', 'seconds', 'containers/s'))
+        for size in options['sizes']:
+            best = min(self.measure(size) for __ in range(options['repeat']))
+            self.stdout.write('{:>8} {:>12.4f} {:>16.0f}'.format(
+                size, best, size / best if best else 0))
+
+    def measure(self, size):
+        """Return the seconds spent to create a one row shelf of ``size``."""
+        with transaction.atomic():
+            author, __ = User.objects.get_or_create(username='benchshelf')
+            start = time.perf_counter()
+            Shelf.objects.create(
+                name='Benchmark', code='benchmark', cols=size, rows=1,
+                author=author)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed
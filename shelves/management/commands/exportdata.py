@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from shelves import exports
+
+
+class Command(BaseCommand):
+    """Export the data of a user::
+
+        ./manage.py exportdata binders admin --format ndjson > binders.ndjson
+
+    """
+    help = "Export the customers, shelves or binders of a user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(exports.RESOURCES))
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=sorted(exports.FORMATS), default='csv')
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('User "{}" does not exist.'.format(
+                options['username']))
+        for line in exports.export(
+                options['resource'], author, options['format']):
+            self.stdout.write(line, ending='')
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from shelves.synthetic import generate
+
+
+class Command(BaseCommand):
+    """Generate a synthetic dataset for the benchmarks.
+
+    The same arguments give the same dataset; use another prefix to add a
+    second one::
+
+        ./manage.py gendata --users 10 --shelves 4 --cols 16 --rows 8
+
+    """
+    help = "Generate users, shelves, customers, binders and attachments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix', default='synthetic',
+            help="Prefix of the usernames and of the codes.")
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument(
+            '--shelves', type=int, default=4, help="Shelves per user.")
+        parser.add_argument('--cols', type=int, default=8)
+        parser.add_argument('--rows', type=int, default=8)
+        parser.add_argument(
+            '--fill', type=float, default=0.75,
+            help="Fraction of the containers holding a binder.")
+        parser.add_argument(
+            '--attachments', type=int, default=1,
+            help="Attachments per binder.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--no-index', action='store_false', dest='index',
+            help="Don't rebuild the binder search index.")
+
+    def handle(self, *args, **options):
+        counts = generate(
+            prefix=options['prefix'],
+            users=options['users'],
+            shelves=options['shelves'],
+            cols=options['cols'],
+            rows=options['rows'],
+            fill=options['fill'],
+            attachments=options['attachments'],
+            seed=options['seed'],
+            index=options['index'],
+        )
+        for model, count in sorted(counts.items()):
+            self.stdout.write('{:>12} {}'.format(model, count))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shelves.models import ShelfEvent
+
+
+class Command(BaseCommand):
+    help = "Delete the shelf events older than the given hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        deleted, __ = ShelfEvent.objects.filter(created__lt=since).delete()
+        self.stdout.write('{} shelf events deleted.'.format(deleted))
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shelves.uploads import purge
+
+
+class Command(BaseCommand):
+    help = "Delete the attachment uploads untouched for the given hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        deleted = purge(since)
+        self.stdout.write('{} attachment uploads deleted.'.format(deleted))
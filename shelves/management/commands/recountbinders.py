@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from shelves.signals import recount_binders
+
+
+class Command(BaseCommand):
+    help = "Rebuild the shelf and container occupancy counters."
+
+    def handle(self, *args, **options):
+        recount_binders()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from shelves.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the binder search index."
+
+    def handle(self, *args, **options):
+        rebuild_index()
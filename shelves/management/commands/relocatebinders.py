@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from shelves.locations import rebuild_locations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the binder location table."
+
+    def handle(self, *args, **options):
+        rebuild_locations()
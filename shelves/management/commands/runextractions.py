@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from shelves.extraction import claim_attachments, process_attachment
+from shelves.workers import run_workers
+
+
+class Command(BaseCommand):
+    """Extract the text of the new attachments.
+
+    Run one or more workers next to the web server::
+
+        ./manage.py runextractions --workers 2
+
+    """
+    help = "Extract the pending texts of the attachments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Number of texts extracted at once.")
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit when there are no more pending extractions.")
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help="Seconds between two polls of the pending extractions.")
+
+    def handle(self, *args, **options):
+        run_workers(
+            claim_attachments, process_attachment, options['workers'],
+            once=options['once'], interval=options['interval'],
+            log=self.log)
+
+    def log(self, pk, status):
+        self.stdout.write('Attachment {}: {}'.format(pk, status))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shelves.imports import claim_import_job, run_import_job
+
+
+class Command(BaseCommand):
+    """Process the queued import jobs.
+
+    Run one or more workers next to the web server::
+
+        ./manage.py runimports
+
+    """
+    help = "Process the queued CSV import jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit when there are no more queued jobs.")
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help="Seconds between two polls of the queue.")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_import_job()
+            if job:
+                run_import_job(job)
+                self.stdout.write('Import job {}: {}'.format(
+                    job.id, job.get_status_display()))
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shelves.uploads import claim_upload, run_upload
+
+
+class Command(BaseCommand):
+    """Join the parts of the completed attachment uploads.
+
+    Run one or more workers next to the web server::
+
+        ./manage.py runuploads
+
+    """
+    help = "Join the parts of the completed attachment uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit when there are no more queued uploads.")
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help="Seconds between two polls of the queue.")
+
+    def handle(self, *args, **options):
+        while True:
+            upload = claim_upload()
+            if upload:
+                run_upload(upload)
+                self.stdout.write('Attachment upload {}: {}'.format(
+                    upload.pk, upload.get_status_display()))
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
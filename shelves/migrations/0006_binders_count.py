@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 09:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_binders(apps, schema_editor):
+    """Initialize the occupancy counters of the existing rows."""
+    relations = (('Container', 'binder'), ('Shelf', 'container__binder'))
+    for model_name, relation in relations:
+        model = apps.get_model('shelves', model_name)
+        counts = model.objects.annotate(count=Count(relation))
+        for pk, count in counts.values_list('pk', 'count'):
+            model.objects.filter(pk=pk).update(binders_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0005_attached'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='container',
+            name='binders_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained by the binder signals.', verbose_name='Binders number'),
+        ),
+        migrations.AddField(
+            model_name='shelf',
+            name='binders_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Maintained by the binder signals.', verbose_name='Binders number'),
+        ),
+        migrations.RunPython(count_binders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 09:30
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE shelves_binder_fts "
+    "USING fts5(title, customer, content)",
+    "INSERT INTO shelves_binder_fts (rowid, title, customer, content) "
+    "SELECT b.id, b.title, COALESCE(c.code || ' ' || c.name, ''), b.content "
+    "FROM shelves_binder b "
+    "LEFT JOIN shelves_customer c ON c.uuid = b.customer_id",
+)
+SQLITE_BACKWARD = (
+    "DROP TABLE shelves_binder_fts",
+)
+
+POSTGRESQL_FORWARD = (
+    "ALTER TABLE shelves_binder ADD COLUMN search_vector tsvector",
+    "CREATE INDEX shelves_binder_search_vector "
+    "ON shelves_binder USING gin (search_vector)",
+    "UPDATE shelves_binder b SET search_vector = "
+    "setweight(to_tsvector('simple', b.title), 'A') || "
+    "setweight(to_tsvector('simple', COALESCE(("
+    "SELECT c.code || ' ' || c.name FROM shelves_customer c "
+    "WHERE c.uuid = b.customer_id), '')), 'B') || "
+    "setweight(to_tsvector('simple', b.content), 'C')",
+)
+POSTGRESQL_BACKWARD = (
+    "ALTER TABLE shelves_binder DROP COLUMN search_vector",
+)
+
+
+def run(statements):
+    """Run the statements of the current database vendor."""
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0006_binders_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({
+                'sqlite': SQLITE_FORWARD,
+                'postgresql': POSTGRESQL_FORWARD
+            }),
+            run({
+                'sqlite': SQLITE_BACKWARD,
+                'postgresql': POSTGRESQL_BACKWARD
+            }),
+        ),
+    ]
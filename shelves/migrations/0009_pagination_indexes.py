@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 10:30
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shelves', '0008_importjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='binder',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='customer',
+            index_together=set([('author', 'code')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='shelf',
+            index_together=set([('author', 'code')]),
+        ),
+    ]
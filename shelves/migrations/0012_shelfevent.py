@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shelves', '0011_binderdeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShelfEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('placed', 'Placed'), ('updated', 'Updated'), ('removed', 'Removed')], max_length=8, verbose_name='Kind')),
+                ('binder_id', models.PositiveIntegerField(verbose_name='Binder id')),
+                ('container_id', models.PositiveIntegerField(verbose_name='Container id')),
+                ('color', models.CharField(blank=True, max_length=6, verbose_name='Color')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('shelf', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='shelves.Shelf')),
+            ],
+            options={
+                'verbose_name': 'Shelf event',
+                'verbose_name_plural': 'Shelf events',
+            },
+        ),
+    ]
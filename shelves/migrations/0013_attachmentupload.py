@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 12:30
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shelves', '0012_shelfevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentUpload',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=64, verbose_name='Title')),
+                ('filename', models.CharField(max_length=100, verbose_name='File name')),
+                ('size', models.BigIntegerField(help_text='Bytes.', verbose_name='Size')),
+                ('sha256', models.CharField(blank=True, help_text='Optional checksum of the whole file.', max_length=64, verbose_name='SHA-256')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('binder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shelves.Binder')),
+            ],
+            options={
+                'verbose_name': 'Attachment upload',
+                'verbose_name_plural': 'Attachment uploads',
+            },
+        ),
+        migrations.CreateModel(
+            name='AttachmentUploadPart',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Number')),
+                ('size', models.PositiveIntegerField(help_text='Bytes.', verbose_name='Size')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('file', models.FileField(upload_to='parts')),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shelves.AttachmentUpload')),
+            ],
+            options={
+                'verbose_name': 'Attachment upload part',
+                'verbose_name_plural': 'Attachment upload parts',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='attachmentuploadpart',
+            unique_together=set([('upload', 'number')]),
+        ),
+    ]
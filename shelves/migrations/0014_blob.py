@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 13:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import shelves.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0013_attachmentupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Name')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(help_text='Bytes.', verbose_name='Size')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='References')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Blob',
+                'verbose_name_plural': 'Blobs',
+            },
+        ),
+        migrations.AlterField(
+            model_name='attached',
+            name='file',
+            field=models.FileField(storage=shelves.storage.BlobStorage(), upload_to='docs'),
+        ),
+        migrations.AlterField(
+            model_name='upload',
+            name='csv_file',
+            field=models.FileField(storage=shelves.storage.BlobStorage(), upload_to='docs', verbose_name='File CSV'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 14:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0014_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attached',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('none', 'Unsupported'), ('failed', 'Failed')], db_index=True, default='pending', max_length=8, verbose_name='Preview'),
+        ),
+    ]
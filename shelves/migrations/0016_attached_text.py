@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 14:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# NOTE: FTS5 tables can't be altered, the index is built again with the
+# attachments column, empty until the texts are extracted.
+SQLITE_FORWARD = (
+    "DROP TABLE shelves_binder_fts",
+    "CREATE VIRTUAL TABLE shelves_binder_fts "
+    "USING fts5(title, customer, content, attachments)",
+    "INSERT INTO shelves_binder_fts "
+    "(rowid, title, customer, content, attachments) "
+    "SELECT b.id, b.title, COALESCE(c.code || ' ' || c.name, ''), "
+    "b.content, '' "
+    "FROM shelves_binder b "
+    "LEFT JOIN shelves_customer c ON c.uuid = b.customer_id",
+)
+SQLITE_BACKWARD = (
+    "DROP TABLE shelves_binder_fts",
+    "CREATE VIRTUAL TABLE shelves_binder_fts "
+    "USING fts5(title, customer, content)",
+    "INSERT INTO shelves_binder_fts (rowid, title, customer, content) "
+    "SELECT b.id, b.title, COALESCE(c.code || ' ' || c.name, ''), b.content "
+    "FROM shelves_binder b "
+    "LEFT JOIN shelves_customer c ON c.uuid = b.customer_id",
+)
+
+
+def run(statements):
+    """Run the statements of the current database vendor."""
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, ()):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0015_attached_preview_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attached',
+            name='text',
+            field=models.TextField(blank=True, editable=False, verbose_name='Text'),
+        ),
+        migrations.AddField(
+            model_name='attached',
+            name='text_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('none', 'Unsupported'), ('failed', 'Failed')], db_index=True, default='pending', max_length=8, verbose_name='Text extraction'),
+        ),
+        # NOTE: The PostgreSQL search vector gets the attachments as the
+        # fourth weight when the binders are indexed again.
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 15:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def locate_binders(apps, schema_editor):
+    """Locate the existing binders."""
+    Binder = apps.get_model('shelves', 'Binder')
+    BinderLocation = apps.get_model('shelves', 'BinderLocation')
+    values = Binder.objects.values_list(
+        'id', 'container__shelf__author', 'customer__code',
+        'container__shelf', 'container__shelf__code', 'container',
+        'container__col', 'container__row')
+    BinderLocation.objects.bulk_create([
+        BinderLocation(
+            binder_id=binder, author_id=author, customer_code=customer or '',
+            shelf_id=shelf, shelf_code=code, container_id=container,
+            col=col, row=row)
+        for binder, author, customer, shelf, code, container, col, row
+        in values.iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shelves', '0016_attached_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BinderLocation',
+            fields=[
+                ('binder', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='location', serialize=False, to='shelves.Binder')),
+                ('customer_code', models.SlugField(blank=True, db_index=False, max_length=16, verbose_name='Customer code')),
+                ('shelf_code', models.SlugField(db_index=False, max_length=16, verbose_name='Shelf code')),
+                ('col', models.IntegerField(blank=True, null=True, verbose_name='Column')),
+                ('row', models.IntegerField(blank=True, null=True, verbose_name='Row')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shelves.Container')),
+                ('shelf', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shelves.Shelf')),
+            ],
+            options={
+                'verbose_name': 'Binder location',
+                'verbose_name_plural': 'Binder locations',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='binderlocation',
+            index_together=set([('author', 'customer_code')]),
+        ),
+        migrations.RunPython(locate_binders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.7 on 2026-10-18 18:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shelves', '0017_binderlocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachmentupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='uploading', max_length=9, verbose_name='Status'),
+        ),
+        migrations.AddField(
+            model_name='attachmentupload',
+            name='error',
+            field=models.TextField(blank=True, verbose_name='Error'),
+        ),
+        migrations.AddField(
+            model_name='attachmentupload',
+            name='attached',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='shelves.Attached'),
+        ),
+        migrations.AddField(
+            model_name='attachmentupload',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
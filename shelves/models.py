@@ -1,13 +1,35 @@
-# import json
+import json
+import os
 import uuid
 
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 # from django.contrib.auth.models import User
 
+from .storage import BlobStorage, PREVIEW_SUFFIX
+
+# NOTE: Maintained by the F() updates of the binder signals only.
+COUNTER_FIELDS = ('binders_count',)
+
+
+def exclude_counters(instance, kwargs):
+    """Return the ``save()`` keyword arguments updating an existing
+    ``instance`` without its counters.
+
+    A full save of a stale instance would write its old counts back.
+    """
+    if (instance._state.adding or kwargs.get('force_insert') or
+            kwargs.get('update_fields') is not None):
+        return kwargs
+    return dict(kwargs, update_fields=[
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in COUNTER_FIELDS])
+
 
 class Customer(models.Model):
     # TODO: Remove if the router uses the code field instead of the uuid field.
@@ -37,6 +59,7 @@ class Customer(models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE
     )
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         # return self.user.username
@@ -46,6 +69,8 @@ class Customer(models.Model):
         verbose_name = _('Customer')
         verbose_name_plural = _('Customers')
         unique_together = (("code", "author"),)
+        # NOTE: Keyset pagination of the author customers by code.
+        index_together = (("author", "code"),)
 
 
 '''
@@ -94,9 +119,13 @@ class Shelf(models.Model):
     nums = models.PositiveIntegerField(
         _('Containers number'), validators=[MinValueValidator(1)],
         help_text=_('The number of containers'), blank=True, null=True)
+    binders_count = models.PositiveIntegerField(
+        _('Binders number'), default=0, editable=False,
+        help_text=_('Maintained by the binder signals.'))
 
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated = models.DateTimeField(auto_now=True)
 
     def clean(self):
         """Validate columns and rows fields.
@@ -114,31 +143,39 @@ class Shelf(models.Model):
             raise ValidationError(
                 _("At least one dimensional value is required."))
 
-        if self.cols and self.rows and self.cols*self.rows > 2**6:
+        max_containers = settings.SHELVES_MAX_CONTAINERS
+        if self.cols and self.rows and self.cols*self.rows > max_containers:
             raise ValidationError(_("Too much containers for one shelf."))
-        elif self.nums and self.nums > 2**6:
+        elif self.nums and self.nums > max_containers:
             raise ValidationError(_("Too much containers."))
 
     def save(self, *args, **kwargs):
         """Update or create containers."""
         if self.id:
             # NOTE: Update containers.
-            super(Shelf, self).save(*args, **kwargs)
+            super(Shelf, self).save(*args, **exclude_counters(self, kwargs))
         else:
-            # NOTE: Create containers.
-            if self.cols and self.rows:
-                self.nums = self.cols*self.rows
-                super(Shelf, self).save(*args, **kwargs)
-                for col in range(self.cols):
-                    for row in range(self.rows):
-                        container = Container(
-                            shelf=self, col=col+1, row=row+1)
-                        container.save()
-            elif self.nums:
-                super(Shelf, self).save(*args, **kwargs)
-                for __ in range(self.nums):
-                    container = Container(shelf=self)
-                    container.save()
+            # NOTE: Create containers in a few INSERT batches; the shelf and
+            # its containers are rolled back together on failure.
+            with transaction.atomic():
+                if self.cols and self.rows:
+                    self.nums = self.cols*self.rows
+                    super(Shelf, self).save(*args, **kwargs)
+                    containers = [
+                        Container(shelf=self, col=col+1, row=row+1)
+                        for col in range(self.cols)
+                        for row in range(self.rows)
+                    ]
+                elif self.nums:
+                    super(Shelf, self).save(*args, **kwargs)
+                    containers = [
+                        Container(shelf=self) for __ in range(self.nums)]
+                else:
+                    return
+                Container.objects.bulk_create(
+                    containers,
+                    batch_size=Container.get_batch_size(containers)
+                )
 
     def __str__(self):
         return '{}'.format(self.code)
@@ -147,6 +184,8 @@ class Shelf(models.Model):
         verbose_name = _('Shelf')
         verbose_name_plural = _('Shelves')
         unique_together = (("code", "author"),)
+        # NOTE: Keyset pagination of the author shelves by code.
+        index_together = (("author", "code"),)
 
 
 class ContainerManager(models.Manager):
@@ -161,6 +200,9 @@ class Container(models.Model):
     shelf = models.ForeignKey(Shelf, on_delete=models.CASCADE)
     col = models.IntegerField(_('Column'), blank=True, null=True)
     row = models.IntegerField(_('Row'), blank=True, null=True)
+    binders_count = models.PositiveIntegerField(
+        _('Binders number'), default=0, editable=False,
+        help_text=_('Maintained by the binder signals.'))
     # jsoncoord = models.CharField(_('Coordinate'), max_length=64, blank=True)
 
     # objects = ContainerManager()
@@ -168,6 +210,21 @@ class Container(models.Model):
     def __str__(self):
         return '{}'.format(self.id)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **exclude_counters(self, kwargs))
+
+    @classmethod
+    def get_batch_size(cls, containers):
+        """Return the number of ``containers`` created by INSERT, at most
+        ``SHELVES_CONTAINERS_BATCH_SIZE`` and the database limit.
+        """
+        fields = [
+            field for field in cls._meta.concrete_fields
+            if not field.primary_key]
+        return min(
+            settings.SHELVES_CONTAINERS_BATCH_SIZE,
+            connection.ops.bulk_batch_size(fields, containers))
+
     # def save(self, *args, **kwargs):
     #     """Add a jsoncoord field based on the row and the column."""
     #     list_int = [self.col, self.row]
@@ -190,7 +247,7 @@ class Binder(models.Model):
     content = models.TextField(_('Binder content'), blank=True)
     color = models.CharField(
         _('Color'), blank=True, max_length=6, help_text=_('Hex value.'))
-    updated = models.DateTimeField(auto_now=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return '{}'.format(self.id)
@@ -200,11 +257,110 @@ class Binder(models.Model):
         verbose_name_plural = _('Binders')
 
 
+class BinderLocation(models.Model):
+    """Denormalized location of a binder, kept in sync by the signals.
+
+    A binder is located by the customer code or the binder id with one
+    indexed lookup, without joining the customer, container and shelf.
+    """
+    binder = models.OneToOneField(
+        Binder, on_delete=models.CASCADE, primary_key=True,
+        related_name='location')
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    customer_code = models.SlugField(
+        _('Customer code'), max_length=16, blank=True, db_index=False)
+    shelf = models.ForeignKey(Shelf, on_delete=models.CASCADE)
+    shelf_code = models.SlugField(
+        _('Shelf code'), max_length=16, db_index=False)
+    container = models.ForeignKey(Container, on_delete=models.CASCADE)
+    col = models.IntegerField(_('Column'), blank=True, null=True)
+    row = models.IntegerField(_('Row'), blank=True, null=True)
+
+    def __str__(self):
+        return '{}: {} {}'.format(self.binder_id, self.shelf_code,
+                                  self.container_id)
+
+    class Meta:
+        verbose_name = _('Binder location')
+        verbose_name_plural = _('Binder locations')
+        index_together = (("author", "customer_code"),)
+
+
+class BinderDeletion(models.Model):
+    """Deleted binders log for the delta synchronization."""
+    binder_id = models.PositiveIntegerField(_('Binder id'))
+    # NOTE: The deletions are logged while the author may be deleted too.
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        db_constraint=False)
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{}'.format(self.binder_id)
+
+    class Meta:
+        verbose_name = _('Binder deletion')
+        verbose_name_plural = _('Binder deletions')
+
+
+class ShelfEvent(models.Model):
+    """Binder placements and removals streamed to the shelf viewers."""
+    PLACED = 'placed'
+    UPDATED = 'updated'
+    REMOVED = 'removed'
+    KIND_CHOICES = (
+        (PLACED, _('Placed')),
+        (UPDATED, _('Updated')),
+        (REMOVED, _('Removed')),
+    )
+
+    # NOTE: The removals are logged while the shelf may be deleted too.
+    shelf = models.ForeignKey(
+        Shelf, on_delete=models.CASCADE, db_constraint=False)
+    kind = models.CharField(_('Kind'), max_length=8, choices=KIND_CHOICES)
+    binder_id = models.PositiveIntegerField(_('Binder id'))
+    container_id = models.PositiveIntegerField(_('Container id'))
+    color = models.CharField(_('Color'), blank=True, max_length=6)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return '{}'.format(self.id)
+
+    class Meta:
+        verbose_name = _('Shelf event')
+        verbose_name_plural = _('Shelf events')
+
+
 class Attached(models.Model):
-    """Binder attachments."""
+    """Binder attachments.
+
+    The previews are rendered by ``./manage.py runpreviews`` and the text is
+    extracted by ``./manage.py runextractions``.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    UNSUPPORTED = 'none'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _('Pending')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (UNSUPPORTED, _('Unsupported')),
+        (FAILED, _('Failed')),
+    )
+
     title = models.CharField(_('Title'), max_length=64)
     binder = models.ForeignKey('Binder', on_delete=models.CASCADE)
-    file = models.FileField(upload_to='docs')
+    file = models.FileField(upload_to='docs', storage=BlobStorage())
+    preview_status = models.CharField(
+        _('Preview'), max_length=8, choices=STATUS_CHOICES,
+        default=PENDING, db_index=True)
+    text = models.TextField(_('Text'), blank=True, editable=False)
+    text_status = models.CharField(
+        _('Text extraction'), max_length=8, choices=STATUS_CHOICES,
+        default=PENDING, db_index=True)
 
     class Meta:
         verbose_name = _('Attachment')
@@ -213,8 +369,175 @@ class Attached(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # NOTE: A new file needs a new preview and text.
+        if self.file.name != getattr(self, '_loaded_file_name', None):
+            self.preview_status = self.PENDING
+            self.text_status = self.PENDING
+            self.text = ''
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def claim_pending(cls, status_field, limit):
+        """Mark up to ``limit`` attachments whose ``status_field`` is pending
+        as running and return their primary keys.
+
+        Each one is claimed by a conditional update, so concurrent workers
+        never process the same attachment.
+        """
+        pending = cls.objects.filter(**{status_field: cls.PENDING})
+        pks = list(pending.order_by('pk').values_list('pk', flat=True)[:limit])
+        return [
+            pk for pk in pks
+            if pending.filter(pk=pk).update(**{status_field: cls.RUNNING})
+        ]
+
+    @property
+    def preview_name(self):
+        return self.file.name + PREVIEW_SUFFIX
+
+    def get_preview_url(self):
+        """Return the URL of the preview, changing with the file."""
+        if self.preview_status != self.DONE:
+            return None
+        return reverse('shelves:attachment-preview', kwargs={
+            'pk': self.pk,
+            'name': os.path.basename(self.preview_name),
+        })
+
+
+class AttachmentUpload(models.Model):
+    """Resumable upload of a binder attachment, sent in parts.
+
+    The parts are joined by ``./manage.py runuploads`` once completed.
+    """
+    UPLOADING = 'uploading'
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (UPLOADING, _('Uploading')),
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    )
+
+    uuid = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, editable=False)
+    binder = models.ForeignKey('Binder', on_delete=models.CASCADE)
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    title = models.CharField(_('Title'), max_length=64)
+    filename = models.CharField(_('File name'), max_length=100)
+    size = models.BigIntegerField(_('Size'), help_text=_('Bytes.'))
+    sha256 = models.CharField(
+        _('SHA-256'), max_length=64, blank=True,
+        help_text=_('Optional checksum of the whole file.'))
+    status = models.CharField(
+        _('Status'), max_length=9, choices=STATUS_CHOICES, default=UPLOADING,
+        db_index=True)
+    error = models.TextField(_('Error'), blank=True)
+    attached = models.ForeignKey(
+        Attached, on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.filename
+
+    class Meta:
+        verbose_name = _('Attachment upload')
+        verbose_name_plural = _('Attachment uploads')
+
+
+class AttachmentUploadPart(models.Model):
+    """Part of an attachment upload, stored as its own file."""
+    upload = models.ForeignKey(AttachmentUpload, on_delete=models.CASCADE)
+    number = models.PositiveIntegerField(_('Number'))
+    size = models.PositiveIntegerField(_('Size'), help_text=_('Bytes.'))
+    sha256 = models.CharField(_('SHA-256'), max_length=64)
+    file = models.FileField(upload_to='parts')
+
+    def __str__(self):
+        return '{}'.format(self.number)
+
+    class Meta:
+        verbose_name = _('Attachment upload part')
+        verbose_name_plural = _('Attachment upload parts')
+        unique_together = (("upload", "number"),)
+
+
+class Blob(models.Model):
+    """File of the content-addressed storage."""
+    name = models.CharField(_('Name'), max_length=100, primary_key=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    size = models.BigIntegerField(_('Size'), help_text=_('Bytes.'))
+    references = models.PositiveIntegerField(_('References'), default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = _('Blob')
+        verbose_name_plural = _('Blobs')
+
 
 class Upload(models.Model):
     """Upload customers."""
-    csv_file = models.FileField('File CSV', upload_to='docs')
+    csv_file = models.FileField(
+        'File CSV', upload_to='docs', storage=BlobStorage())
     created = models.DateField(auto_now_add=True)
+
+
+class ImportJob(models.Model):
+    """Background import of an upload, run by ``./manage.py runimports``."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    )
+
+    upload = models.ForeignKey(Upload, on_delete=models.CASCADE)
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    status = models.CharField(
+        _('Status'), max_length=8, choices=STATUS_CHOICES, default=QUEUED,
+        db_index=True)
+    rows = models.PositiveIntegerField(_('Processed rows'), default=0)
+    customers_created = models.PositiveIntegerField(
+        _('Created customers'), default=0)
+    customers_skipped = models.PositiveIntegerField(
+        _('Skipped customers'), default=0)
+    errors = models.TextField(
+        _('Errors'), blank=True, help_text=_('JSON list of line errors.'))
+    queued = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def error_list(self):
+        return json.loads(self.errors) if self.errors else []
+
+    @property
+    def rows_per_second(self):
+        if not self.started:
+            return 0
+        elapsed = ((self.finished or timezone.now()) - self.started)
+        seconds = elapsed.total_seconds()
+        return self.rows / seconds if seconds else 0
+
+    def __str__(self):
+        return '{}'.format(self.id)
+
+    class Meta:
+        verbose_name = _('Import job')
+        verbose_name_plural = _('Import jobs')
@@ -0,0 +1,211 @@
+"""Move many binders at once.
+
+A move plan is validated in memory against one query of the binders and one
+of the containers, then applied in one transaction with a few ``UPDATE``
+statements per chunk of moves. The statements bypass the binder signals,
+so the plan maintains what they would:
+
+- the occupancy counters of the containers and of the shelves;
+- the binder locations;
+- the ``updated`` timestamps, for the delta synchronization and the ETags;
+- the placement and removal events of the shelves.
+
+The search index doesn't include the container, so it's left as is.
+"""
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, CharField, F, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+
+from .models import (
+    Shelf,
+    Container,
+    Binder,
+    BinderLocation,
+    ShelfEvent,
+)
+
+CHUNK_SIZE = 500
+
+Move = namedtuple('Move', ('binder', 'color', 'source', 'target'))
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def get_containers(ids, author=None):
+    """Return the ``(shelf, shelf code, col, row, binders count)`` of the
+    containers ``ids`` by container id.
+    """
+    containers = {}
+    queryset = Container.objects.all()
+    if author is not None:
+        queryset = queryset.filter(shelf__author=author)
+    for chunk in chunks(ids):
+        values = queryset.filter(pk__in=chunk).values_list(
+            'id', 'shelf', 'shelf__code', 'col', 'row', 'binders_count')
+        for container_id, *value in values:
+            containers[container_id] = value
+    return containers
+
+
+def check_capacity(moves, containers, capacity):
+    """Refuse to fill a container beyond ``capacity``.
+
+    The containers already beyond it may keep their binders.
+    """
+    deltas = Counter()
+    for move in moves:
+        deltas[move.source] -= 1
+        deltas[move.target] += 1
+    full = sorted(
+        pk for pk, delta in deltas.items()
+        if delta > 0 and containers[pk][4] + delta > capacity)
+    if full:
+        raise ValidationError(
+            _('Too many binders for the containers {}.').format(
+                ', '.join(map(str, full))),
+            code='full')
+
+
+def plan_moves(author, pairs, capacity=None):
+    """Return the moves of the ``(binder id, container id)`` pairs.
+
+    The binders and the containers must belong to ``author``.
+    """
+    capacity = capacity or settings.SHELVES_CONTAINER_CAPACITY
+    targets = dict(pairs)
+    if len(targets) != len(pairs):
+        raise ValidationError(
+            _('A binder is moved more than once.'), code='duplicate')
+
+    binders = {}
+    for chunk in chunks(targets):
+        values = Binder.objects.filter(
+            container__shelf__author=author, pk__in=chunk
+        ).values_list('id', 'container', 'color')
+        for binder_id, container_id, color in values:
+            binders[binder_id] = (container_id, color)
+    missing = sorted(set(targets) - set(binders))
+    if missing:
+        raise ValidationError(
+            _('Unknown binders: {}.').format(', '.join(map(str, missing))),
+            code='invalid')
+
+    moves = [
+        Move(binder_id, binders[binder_id][1], binders[binder_id][0], target)
+        for binder_id, target in pairs
+        if binders[binder_id][0] != target
+    ]
+    containers = get_containers(
+        {move.source for move in moves} | {move.target for move in moves},
+        author)
+    missing = sorted({move.target for move in moves} - set(containers))
+    if missing:
+        raise ValidationError(
+            _('Unknown containers: {}.').format(', '.join(map(str, missing))),
+            code='invalid')
+    check_capacity(moves, containers, capacity)
+    return moves
+
+
+def plan_compaction(shelf, capacity=None):
+    """Return the moves packing the binders of ``shelf`` in its first
+    containers, row by row, keeping their order.
+    """
+    capacity = capacity or settings.SHELVES_CONTAINER_CAPACITY
+    containers = list(Container.objects.filter(
+        shelf=shelf).order_by('row', 'col', 'id').values_list('id', flat=True))
+    binders = Binder.objects.filter(container__shelf=shelf).order_by(
+        'container__row', 'container__col', 'container', 'id'
+    ).values_list('id', 'color', 'container')
+    moves = []
+    for i, (binder_id, color, source) in enumerate(binders):
+        if i // capacity >= len(containers):
+            raise ValidationError(
+                _('Too many binders for the shelf {}.').format(shelf),
+                code='full')
+        target = containers[i // capacity]
+        if target != source:
+            moves.append(Move(binder_id, color, source, target))
+    return moves
+
+
+def case(values, default=None, output_field=None):
+    """Return a ``CASE`` expression of the ``{pk: expression}`` values."""
+    return Case(
+        *[When(pk=pk, then=value) for pk, value in values.items()],
+        default=default, output_field=output_field or IntegerField())
+
+
+def apply_moves(moves):
+    """Apply the ``moves`` in one transaction and return their number."""
+    now = timezone.now()
+    with transaction.atomic():
+        for chunk in chunks(moves):
+            containers = get_containers(
+                {move.source for move in chunk} |
+                {move.target for move in chunk})
+            Binder.objects.filter(
+                pk__in=[move.binder for move in chunk]
+            ).update(
+                container=case({
+                    move.binder: Value(move.target) for move in chunk}),
+                updated=now,
+            )
+
+            container_deltas, shelf_deltas = Counter(), Counter()
+            for move in chunk:
+                container_deltas[move.source] -= 1
+                container_deltas[move.target] += 1
+                shelf_deltas[containers[move.source][0]] -= 1
+                shelf_deltas[containers[move.target][0]] += 1
+            for model, deltas in ((Container, container_deltas),
+                                  (Shelf, shelf_deltas)):
+                deltas = {pk: delta for pk, delta in deltas.items() if delta}
+                if deltas:
+                    model.objects.filter(pk__in=deltas).update(
+                        binders_count=case({
+                            pk: F('binders_count') + delta
+                            for pk, delta in deltas.items()
+                        }, default=F('binders_count')))
+
+            targets = {move.binder: move.target for move in chunk}
+            BinderLocation.objects.filter(binder__in=targets).update(
+                container=case({
+                    binder: Value(target)
+                    for binder, target in targets.items()}),
+                shelf=case({
+                    binder: Value(containers[target][0])
+                    for binder, target in targets.items()}),
+                shelf_code=case({
+                    binder: Value(containers[target][1])
+                    for binder, target in targets.items()
+                }, output_field=CharField()),
+                col=case({
+                    binder: Value(containers[target][2])
+                    for binder, target in targets.items()}),
+                row=case({
+                    binder: Value(containers[target][3])
+                    for binder, target in targets.items()}),
+            )
+
+            events = []
+            for move in chunk:
+                events.append(ShelfEvent(
+                    shelf_id=containers[move.source][0],
+                    kind=ShelfEvent.REMOVED, binder_id=move.binder,
+                    container_id=move.source, color=move.color))
+                events.append(ShelfEvent(
+                    shelf_id=containers[move.target][0],
+                    kind=ShelfEvent.PLACED, binder_id=move.binder,
+                    container_id=move.target, color=move.color))
+            ShelfEvent.objects.bulk_create(events)
+    return len(moves)
@@ -0,0 +1,137 @@
+"""Previews of the binder attachments.
+
+The thumbnails are rendered in the background by ``./manage.py
+runpreviews``: Pillow resizes the images and ``pdftoppm`` (poppler-utils)
+rasters the first page of the PDF files.
+
+A preview is stored next to its original, named after it: the attachments
+sharing a blob share its preview, which is rendered once, and a preview
+never changes, so it is served with a long-lived ``Cache-Control``.
+"""
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+
+from .models import Binder, Attached
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (
+    '.bmp', '.gif', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+PDF_EXTENSIONS = ('.pdf',)
+PDF_TIMEOUT = 60
+
+
+class UnsupportedFile(Exception):
+    """The file type has no preview."""
+
+
+def render_image(path, size):
+    """Return the JPEG thumbnail of the image at ``path``."""
+    from PIL import Image
+
+    image = Image.open(path)
+    image.thumbnail((size, size))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=80, optimize=True)
+    return output.getvalue()
+
+
+def render_pdf(path, size):
+    """Return the JPEG raster of the first page of the PDF at ``path``."""
+    pdftoppm = shutil.which('pdftoppm')
+    if not pdftoppm:
+        raise UnsupportedFile('pdftoppm is not installed.')
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, 'page')
+        subprocess.check_call([
+            pdftoppm, '-f', '1', '-l', '1', '-singlefile',
+            '-scale-to', str(size), '-jpeg', path, root,
+        ], timeout=PDF_TIMEOUT)
+        with open(root + '.jpg', 'rb') as f:
+            return f.read()
+
+
+def render(field_file, size):
+    """Return the JPEG preview of ``field_file``.
+
+    The file is copied from the storage to a local temporary file first,
+    both renderers needing a seekable file or a path.
+    """
+    extension = os.path.splitext(field_file.name)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        renderer = render_image
+    elif extension in PDF_EXTENSIONS:
+        renderer = render_pdf
+    else:
+        raise UnsupportedFile(extension)
+    with tempfile.NamedTemporaryFile(suffix=extension) as f:
+        field_file.open('rb')
+        try:
+            for chunk in field_file.chunks():
+                f.write(chunk)
+        finally:
+            field_file.close()
+        f.flush()
+        return renderer(f.name, size)
+
+
+def generate_preview(attached, size=None):
+    """Store the preview of ``attached`` unless it exists and return the
+    preview status.
+    """
+    size = size or settings.SHELVES_PREVIEW_SIZE
+    name = attached.file.name
+    status = Attached.DONE
+    if not default_storage.exists(attached.preview_name):
+        try:
+            content = render(attached.file, size)
+        except UnsupportedFile:
+            status = Attached.UNSUPPORTED
+        except Exception:
+            logger.exception('Preview of attachment %s failed.', attached.pk)
+            status = Attached.FAILED
+        else:
+            saved = default_storage.save(
+                attached.preview_name, ContentFile(content))
+            if saved != attached.preview_name:
+                # NOTE: Rendered in the meantime for another attachment.
+                default_storage.delete(saved)
+    # NOTE: The file may have been replaced while rendering.
+    if Attached.objects.filter(pk=attached.pk, file=name).update(
+            preview_status=status):
+        # NOTE: The binder representation includes the preview URL.
+        Binder.objects.filter(pk=attached.binder_id).update(
+            updated=timezone.now())
+    attached.preview_status = status
+    return status
+
+
+def claim_attachments(limit):
+    """Claim up to ``limit`` attachments pending a preview."""
+    return Attached.claim_pending('preview_status', limit)
+
+
+def process_attachment(pk):
+    """Generate the preview of the attachment ``pk`` in a worker thread
+    and return its status.
+    """
+    try:
+        attached = Attached.objects.get(pk=pk)
+    except Attached.DoesNotExist:
+        return None
+    else:
+        return generate_preview(attached)
+    finally:
+        connection.close()
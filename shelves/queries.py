@@ -0,0 +1,153 @@
+"""Count, time and budget the SQL queries of each request.
+
+``QueryBudgetMiddleware`` records the queries of the views of every app,
+admin included, and reports them:
+
+- ``X-Query-Count``, ``X-Query-Time`` (milliseconds) and
+  ``X-Query-Duplicates`` response headers when ``DEBUG`` is on;
+- a log line on the ``shelves.queries`` logger, a warning when the view
+  exceeds its budget or repeats a query.
+
+The budgets are declared by URL name in ``SHELVES_QUERY_BUDGETS``, or by
+the ``query_budget`` attribute of a view class. Two queries are duplicates
+when they differ by their literals only, the sign of an N+1 loop.
+
+The tests enforce the same budgets with ``query_budget()``.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+SAVEPOINT_PREFIXES = (
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\((?:\s*\?\s*,)*\s*\?\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize(sql):
+    """Replace the literals of ``sql``, so the queries of a loop are equal."""
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def get_queries(captured_queries):
+    """Return the captured queries but the savepoints."""
+    return [
+        query for query in captured_queries
+        if not query['sql'].startswith(SAVEPOINT_PREFIXES)]
+
+
+class QueryReport:
+    """The number, duration and duplicates of captured queries."""
+
+    def __init__(self, captured_queries, budget=None):
+        self.queries = get_queries(captured_queries)
+        self.budget = budget
+        self.time = sum(float(query['time']) for query in self.queries)
+        counts = Counter(normalize(query['sql']) for query in self.queries)
+        self.duplicates = {
+            sql: count for sql, count in counts.items() if count > 1}
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def __str__(self):
+        lines = ['{} queries in {:.1f} ms{}.'.format(
+            self.count, self.time * 1000,
+            ', budget {}'.format(self.budget)
+            if self.budget is not None else '')]
+        lines.extend(
+            '{} times: {}'.format(count, sql)
+            for sql, count in sorted(self.duplicates.items()))
+        return '\n'.join(lines)
+
+
+def get_budget(view_func, view_name):
+    """Return the query budget of a view, ``None`` if it has none."""
+    budget = settings.SHELVES_QUERY_BUDGETS.get(view_name)
+    if budget is not None:
+        return budget
+    for view in (view_func, getattr(view_func, 'view_class', None),
+                 getattr(view_func, 'cls', None)):
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None:
+            return budget
+    return None
+
+
+class QueryBudgetMiddleware:
+    """Report the queries of each view and check its budget.
+
+    Add it after the authentication middleware: the session and the user
+    are loaded before the capture starts, so every view is measured
+    without them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # NOTE: The user is lazy, loading it loads the session too.
+        if hasattr(request, 'user'):
+            request.user.pk
+        request.query_budget = None
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        report = QueryReport(context.captured_queries, request.query_budget)
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        level = logging.WARNING \
+            if report.over_budget or report.duplicates else logging.DEBUG
+        logger.log(
+            level, '%s %s %s in %.1f ms: %s', request.method, view_name,
+            response.status_code, duration * 1000, report)
+        if settings.DEBUG:
+            response['X-Query-Count'] = report.count
+            response['X-Query-Time'] = '{:.1f}'.format(report.time * 1000)
+            response['X-Query-Duplicates'] = sum(report.duplicates.values())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_budget(
+            view_func, request.resolver_match.view_name)
+
+
+@contextmanager
+def query_budget(budget, duplicates=False):
+    """Fail unless the block runs at most ``budget`` queries, without
+    duplicates unless ``duplicates``.
+
+    ``budget`` may be the URL name of a view of ``SHELVES_QUERY_BUDGETS``.
+    """
+    if isinstance(budget, str):
+        budget = settings.SHELVES_QUERY_BUDGETS[budget]
+    with CaptureQueriesContext(connection) as context:
+        yield context
+    report = QueryReport(context.captured_queries, budget)
+    if report.over_budget or (report.duplicates and not duplicates):
+        raise QueryBudgetExceeded(str(report))
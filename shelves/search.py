@@ -0,0 +1,215 @@
+"""Binder full-text search.
+
+The binders are indexed by title, content, customer and text of their
+attachments, the index being kept in sync by the receivers in ``signals.py``
+and by the text extraction (``extraction.py``):
+
+- SQLite stores the documents in the ``shelves_binder_fts`` FTS5 table;
+- PostgreSQL stores them in the ``search_vector`` column of the binder
+  table, a ``tsvector`` with a GIN index.
+
+Other backends fall back to the ``icontains`` lookups.
+
+The search may return a snippet of each binder with the matches between
+``START`` and ``STOP`` marks, made safe for HTML by ``highlight()``. SQLite
+cuts it from the FTS5 index; the PostgreSQL index holds no text, so
+``ts_headline`` parses the title and content of the fetched rows only.
+
+Each change of the index bumps a generation number, the version of the
+cached search results.
+"""
+import operator
+import re
+import uuid
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Binder
+
+FTS_TABLE = 'shelves_binder_fts'
+# NOTE: The simple configuration doesn't stem, so it works for any language.
+SEARCH_CONFIG = 'simple'
+
+TSVECTOR_SQL = (
+    "setweight(to_tsvector('{0}', %s), 'A') || "
+    "setweight(to_tsvector('{0}', %s), 'B') || "
+    "setweight(to_tsvector('{0}', %s), 'C') || "
+    "setweight(to_tsvector('{0}', %s), 'D')"
+).format(SEARCH_CONFIG)
+
+# NOTE: Control characters never indexed, replaced after escaping the text.
+START = '\x02'
+STOP = '\x03'
+SNIPPET_WORDS = 16
+GENERATION_KEY = 'shelves:search:generation'
+
+
+def get_generation():
+    """Return the generation of the search index."""
+    # NOTE: ``add`` keeps the generation of a concurrent request, if any.
+    cache.add(GENERATION_KEY, uuid.uuid4().hex, None)
+    return cache.get(GENERATION_KEY)
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def highlight(snippet):
+    """Return the HTML of a snippet, the matches within ``<mark>``."""
+    return mark_safe(escape(snippet).replace(
+        START, '<mark>').replace(STOP, '</mark>'))
+
+
+def tokenize(query):
+    """Split the query in words, dropping the search syntax characters."""
+    return re.findall(r'\w+', query)
+
+
+def get_document(binder):
+    """Return the indexed text of a binder as a (title, customer, content,
+    attachments) tuple, sorted by relevance.
+
+    The text of the attachments is the one already extracted, truncated to
+    ``SHELVES_TEXT_MAX_LENGTH``.
+    """
+    customer = binder.customer
+    texts = binder.attached_set.exclude(text='').values_list('text', flat=True)
+    return (
+        binder.title,
+        '{} {}'.format(customer.code, customer.name) if customer else '',
+        binder.content,
+        ' '.join(texts)[:settings.SHELVES_TEXT_MAX_LENGTH],
+    )
+
+
+def write_document(cursor, binder):
+    """Write the document of a binder in the search index."""
+    document = get_document(binder)
+    if connection.vendor == 'sqlite':
+        cursor.execute(
+            'DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE),
+            [binder.pk])
+        cursor.execute(
+            'INSERT INTO {} (rowid, title, customer, content, '
+            'attachments) VALUES (%s, %s, %s, %s, %s)'.format(FTS_TABLE),
+            [binder.pk] + list(document))
+    elif connection.vendor == 'postgresql':
+        cursor.execute(
+            'UPDATE {} SET search_vector = {} WHERE id = %s'.format(
+                Binder._meta.db_table, TSVECTOR_SQL),
+            list(document) + [binder.pk])
+
+
+def index_binder(binder):
+    """Add or replace a binder in the search index."""
+    with connection.cursor() as cursor:
+        write_document(cursor, binder)
+    bump_generation()
+
+
+def unindex_binder(binder_id):
+    """Remove a binder from the search index."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE),
+                [binder_id])
+    bump_generation()
+
+
+def rebuild_index():
+    """Index every binder from scratch."""
+    binders = Binder.objects.select_related('customer')
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+        for binder in binders.iterator():
+            write_document(cursor, binder)
+    # NOTE: The cached searches are stale once, after the whole rebuild.
+    bump_generation()
+
+
+def search_binders(queryset, query, snippets=False):
+    """Filter the ``queryset`` of binders by ``query``.
+
+    Every word must match, as a prefix, the title, the content, the
+    customer or the attachments. The results are ordered by relevance and
+    the score is available as the ``rank`` attribute (lower is better on
+    SQLite, higher is better on PostgreSQL).
+
+    With ``snippets`` the marked snippet of the best matching column is
+    available as the ``snippet`` attribute, on SQLite and PostgreSQL.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+    table = Binder._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        if snippets:
+            queryset = queryset.extra(select={
+                'snippet': "snippet({}, -1, char(2), char(3), '...', "
+                           "{})".format(FTS_TABLE, SNIPPET_WORDS)})
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                '{}.rowid = {}.id'.format(FTS_TABLE, table),
+                '{} MATCH %s'.format(FTS_TABLE),
+            ],
+            params=[match],
+            # NOTE: Weight the title, customer, content and attachments.
+            select={
+                'rank': 'bm25({}, 10.0, 5.0, 1.0, 0.5)'.format(FTS_TABLE)},
+            # NOTE: The id breaks the ties, so the pages never overlap.
+            order_by=['rank', 'id'],
+        )
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join('{}:*'.format(term) for term in terms)
+        if snippets:
+            queryset = queryset.extra(
+                select={'snippet': (
+                    "ts_headline('{0}', {1}.title || ' ' || {1}.content, "
+                    "to_tsquery('{0}', %s), 'StartSel=' || chr(2) || "
+                    "', StopSel=' || chr(3) || ', MaxWords={2}, "
+                    "MinWords={3}')").format(
+                        SEARCH_CONFIG, table, SNIPPET_WORDS,
+                        SNIPPET_WORDS // 2)},
+                select_params=[tsquery])
+        return queryset.extra(
+            where=["{}.search_vector @@ to_tsquery('{}', %s)".format(
+                table, SEARCH_CONFIG)],
+            params=[tsquery],
+            select={'rank': "ts_rank({}.search_vector, "
+                            "to_tsquery('{}', %s))".format(
+                                table, SEARCH_CONFIG)},
+            select_params=[tsquery],
+            order_by=['-rank', 'id'],
+        )
+
+    return queryset.filter(
+        reduce(
+            operator.and_,
+            (Q(title__icontains=q) for q in terms)
+        ) | reduce(
+            operator.and_,
+            (Q(content__icontains=q) for q in terms)
+        ) | reduce(
+            operator.and_,
+            (Q(customer__code__icontains=q) for q in terms)
+        ) | reduce(
+            operator.and_,
+            (Q(customer__name__icontains=q) for q in terms)
+        ) | reduce(
+            operator.and_,
+            (Q(attached__text__icontains=q) for q in terms)
+        )
+    ).distinct()
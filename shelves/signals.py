@@ -0,0 +1,214 @@
+"""Keep the denormalized data in sync with binders.
+
+- The occupancy counters are updated with ``F()`` expressions so that
+  concurrent requests never overwrite each other's increments;
+- The search index is updated on binder and customer changes;
+- The binder deletions are logged for the delta synchronization;
+- The binder locations are copied on binder, customer, shelf and container
+  changes;
+- The binder placements and removals are published to the shelf viewers;
+- The references of the stored files are released with their owners;
+- The binders are dated by the changes of their attachments.
+"""
+from django.db.models import Count, F
+from django.utils import timezone
+from django.db.models.signals import (
+    post_init,
+    pre_save,
+    post_save,
+    post_delete,
+)
+from django.dispatch import receiver
+
+from . import events, locations, search
+from .models import (
+    Customer,
+    Shelf,
+    Container,
+    Binder,
+    BinderDeletion,
+    BinderLocation,
+    ShelfEvent,
+    Attached,
+    Upload,
+)
+
+
+def update_binders_count(container_id, delta):
+    """Add ``delta`` to the counters of a container and of its shelf."""
+    if not container_id or not delta:
+        return
+    Container.objects.filter(pk=container_id).update(
+        binders_count=F('binders_count') + delta)
+    Shelf.objects.filter(container__pk=container_id).update(
+        binders_count=F('binders_count') + delta)
+
+
+@receiver(post_init, sender=Binder)
+def remember_container(sender, instance, **kwargs):
+    """Remember the loaded container to detect binder moves."""
+    instance._loaded_container_id = instance.container_id
+
+
+@receiver(post_save, sender=Binder)
+def count_saved_binder(sender, instance, created, raw=False, **kwargs):
+    """Increment the new container and decrement the previous one.
+
+    Publish the events of the binder on the way.
+    """
+    if raw:
+        return
+    previous = None if created else instance._loaded_container_id
+    if previous != instance.container_id:
+        update_binders_count(previous, -1)
+        update_binders_count(instance.container_id, 1)
+        if previous:
+            events.publish(ShelfEvent.REMOVED, instance, previous)
+        events.publish(ShelfEvent.PLACED, instance, instance.container_id)
+    else:
+        events.publish(ShelfEvent.UPDATED, instance, instance.container_id)
+    instance._loaded_container_id = instance.container_id
+
+
+@receiver(post_delete, sender=Binder)
+def count_deleted_binder(sender, instance, **kwargs):
+    update_binders_count(instance._loaded_container_id, -1)
+    events.publish(
+        ShelfEvent.REMOVED, instance, instance._loaded_container_id)
+
+
+@receiver(post_save, sender=Binder)
+def index_saved_binder(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_binder(instance)
+
+
+@receiver(post_delete, sender=Binder)
+def unindex_deleted_binder(sender, instance, **kwargs):
+    search.unindex_binder(instance.pk)
+
+
+@receiver(post_delete, sender=Binder)
+def log_deleted_binder(sender, instance, **kwargs):
+    """Leave a tombstone for the clients synchronizing the binders."""
+    author_id = Shelf.objects.filter(
+        container=instance._loaded_container_id
+    ).values_list('author', flat=True).first()
+    if author_id:
+        BinderDeletion.objects.create(
+            binder_id=instance.pk, author_id=author_id)
+
+
+@receiver(post_save, sender=Customer)
+def index_customer_binder(sender, instance, raw=False, **kwargs):
+    """Reindex the binder of the customer, the customer being searchable."""
+    if raw:
+        return
+    for binder in Binder.objects.filter(customer=instance):
+        search.index_binder(binder)
+
+
+@receiver(post_save, sender=Binder)
+def locate_saved_binder(sender, instance, raw=False, **kwargs):
+    if not raw:
+        locations.locate_binder(instance)
+
+
+@receiver(post_save, sender=Customer)
+def relocate_customer_binder(sender, instance, raw=False, **kwargs):
+    if not raw:
+        BinderLocation.objects.filter(binder__customer=instance).update(
+            customer_code=instance.code)
+
+
+@receiver(post_save, sender=Shelf)
+def relocate_shelf_binders(sender, instance, created, raw=False, **kwargs):
+    if not (raw or created):
+        BinderLocation.objects.filter(shelf=instance).update(
+            shelf_code=instance.code)
+
+
+@receiver(post_save, sender=Container)
+def relocate_container_binders(sender, instance, created, raw=False,
+                               **kwargs):
+    if not (raw or created):
+        BinderLocation.objects.filter(container=instance).update(
+            col=instance.col, row=instance.row)
+
+
+FILE_FIELDS = {Attached: 'file', Upload: 'csv_file'}
+
+
+def get_file_name(sender, instance):
+    """Return the file name without loading a deferred field."""
+    value = instance.__dict__.get(FILE_FIELDS[sender])
+    return getattr(value, 'name', value)
+
+
+def remember_file(sender, instance, **kwargs):
+    """Remember the loaded file to release it when replaced."""
+    instance._loaded_file_name = get_file_name(sender, instance)
+
+
+def detect_new_file(sender, instance, raw=False, **kwargs):
+    """Remember whether the save stores a new file."""
+    field_file = getattr(instance, FILE_FIELDS[sender])
+    instance._storing_file = bool(field_file) and not field_file._committed
+
+
+def release_replaced_file(sender, instance, created, raw=False, **kwargs):
+    """Release the previous file once it is replaced.
+
+    A new file with the same content has the same name but a new
+    reference, so the previous one is released too.
+    """
+    field_file = getattr(instance, FILE_FIELDS[sender])
+    previous = instance._loaded_file_name
+    replaced = instance.__dict__.pop('_storing_file', False) or \
+        previous != field_file.name
+    if not (raw or created) and previous and replaced:
+        field_file.storage.delete(previous)
+    instance._loaded_file_name = field_file.name
+
+
+def release_deleted_file(sender, instance, **kwargs):
+    name = get_file_name(sender, instance)
+    if name:
+        getattr(instance, FILE_FIELDS[sender]).storage.delete(name)
+
+
+for model in FILE_FIELDS:
+    post_init.connect(remember_file, sender=model)
+    pre_save.connect(detect_new_file, sender=model)
+    post_save.connect(release_replaced_file, sender=model)
+    post_delete.connect(release_deleted_file, sender=model)
+
+
+@receiver(post_save, sender=Attached)
+@receiver(post_delete, sender=Attached)
+def touch_binder(sender, instance, raw=False, **kwargs):
+    """The binder representation includes its attachments."""
+    if not raw:
+        Binder.objects.filter(pk=instance.binder_id).update(
+            updated=timezone.now())
+
+
+@receiver(post_save, sender=Attached)
+@receiver(post_delete, sender=Attached)
+def index_attachment_binder(sender, instance, raw=False, **kwargs):
+    """Reindex the binder, the attachment text being searchable."""
+    if raw:
+        return
+    binder = Binder.objects.select_related('customer').filter(
+        pk=instance.binder_id).first()
+    if binder:
+        search.index_binder(binder)
+
+
+def recount_binders():
+    """Rebuild every counter from scratch, e.g. after ``loaddata``."""
+    relations = ((Container, 'binder'), (Shelf, 'container__binder'))
+    for model, relation in relations:
+        counts = model.objects.annotate(count=Count(relation))
+        for pk, count in counts.values_list('pk', 'count'):
+            model.objects.filter(pk=pk).update(binders_count=count)
@@ -0,0 +1,122 @@
+"""Content-addressed storage of the attachments and uploads.
+
+The files are named after the SHA-256 of their content, computed while
+streaming them to a temporary file, and written to the default storage
+(S3 or local) only when no ``Blob`` has the same name yet. The blobs count
+their references, so a file is deleted with its last reference, once the
+transaction removing it commits.
+
+The files saved before this storage keep their names and are never
+deleted.
+
+The preview of a file is stored next to it, named after it with
+``PREVIEW_SUFFIX``, and deleted with it.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+BLOBS_LOCATION = 'blobs'
+PREVIEW_SUFFIX = '.preview.jpg'
+
+
+def store(content, name):
+    """Add a reference to the blob of ``content`` and return its name."""
+    from .models import Blob
+
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.TemporaryFile() as f:
+        for chunk in content.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+            f.write(chunk)
+        sha256 = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()[:16]
+        blob_name = '{}/{}/{}{}'.format(
+            BLOBS_LOCATION, sha256[:2], sha256, extension)
+
+        with transaction.atomic():
+            if Blob.objects.filter(name=blob_name).update(
+                    references=F('references') + 1):
+                return blob_name
+            if not default_storage.exists(blob_name):
+                f.seek(0)
+                saved = default_storage.save(blob_name, File(f))
+                if saved != blob_name:
+                    # NOTE: Renamed as a concurrent request wrote the same
+                    # content in the meantime, so the copy is an orphan.
+                    default_storage.delete(saved)
+            try:
+                with transaction.atomic():
+                    Blob.objects.create(
+                        name=blob_name, sha256=sha256, size=size,
+                        references=1)
+            except IntegrityError:
+                # NOTE: Created in the meantime by a concurrent request.
+                Blob.objects.filter(name=blob_name).update(
+                    references=F('references') + 1)
+    return blob_name
+
+
+def release(name):
+    """Remove a reference to the blob ``name``, deleted with the last one."""
+    from .models import Blob
+
+    with transaction.atomic():
+        blobs = Blob.objects.filter(name=name)
+        if not blobs.update(references=F('references') - 1):
+            return
+        deleted, __ = blobs.filter(references__lte=0).delete()
+    if deleted:
+        # NOTE: A rolled back delete keeps the file.
+        transaction.on_commit(lambda: delete_files(name))
+
+
+def delete_files(name):
+    """Delete the file of the blob ``name`` and its preview, unless a
+    concurrent ``store()`` created the blob again in the meantime.
+    """
+    from .models import Blob
+
+    if Blob.objects.filter(name=name).exists():
+        return
+    default_storage.delete(name)
+    default_storage.delete(name + PREVIEW_SUFFIX)
+
+
+@deconstructible
+class BlobStorage(Storage):
+    """Deduplicate the files of the default storage."""
+
+    def get_available_name(self, name, max_length=None):
+        """The name is given by the content in ``_save()``."""
+        return name
+
+    def _save(self, name, content):
+        return store(content, name)
+
+    def _open(self, name, mode='rb'):
+        return default_storage.open(name, mode)
+
+    def delete(self, name):
+        if name.startswith(BLOBS_LOCATION + '/'):
+            release(name)
+
+    def exists(self, name):
+        return default_storage.exists(name)
+
+    def size(self, name):
+        return default_storage.size(name)
+
+    def url(self, name):
+        return default_storage.url(name)
+
+    def path(self, name):
+        return default_storage.path(name)
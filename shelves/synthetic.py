@@ -0,0 +1,144 @@
+"""Generate synthetic datasets for the benchmarks.
+
+Every row is created with ``bulk_create`` and every value, primary keys of
+the customers included, comes from a random generator seeded by ``seed``,
+so the same arguments give the same dataset.
+
+``bulk_create`` bypasses the signals, so the occupancy counters, the binder
+locations and the search index are rebuilt afterwards.
+"""
+import random
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from . import search
+from .locations import rebuild_locations
+from .models import (
+    Customer,
+    Shelf,
+    Container,
+    Binder,
+    Attached,
+    Blob,
+)
+from .signals import recount_binders
+from .storage import store, release
+
+WORDS = (
+    'account', 'agreement', 'archive', 'balance', 'budget', 'certificate',
+    'claim', 'contract', 'declaration', 'deed', 'estimate', 'expense',
+    'insurance', 'invoice', 'lease', 'ledger', 'license', 'loan',
+    'mortgage', 'order', 'payroll', 'pension', 'permit', 'policy',
+    'receipt', 'register', 'report', 'statement', 'survey', 'tax',
+    'transfer', 'warranty',
+)
+NAMES = (
+    'Arthur', 'Bedevere', 'Brian', 'Dennis', 'Galahad', 'Herbert',
+    'Lancelot', 'Maynard', 'Patsy', 'Robin', 'Roger', 'Tim',
+)
+# NOTE: A few distinct attachments, deduplicated by the blob storage.
+SAMPLES = 8
+BATCH_SIZE = 1000
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for __ in range(words))
+
+
+def generate(prefix='synthetic', users=1, shelves=4, cols=8, rows=8,
+             fill=0.75, attachments=1, seed=0, index=True):
+    """Create the dataset and return the number of rows of each model.
+
+    Each of the ``users`` gets ``shelves`` shelves of ``cols`` by ``rows``
+    containers, ``fill`` of them holding a binder of its own customer, and
+    ``attachments`` attachments per binder.
+    """
+    rng = random.Random(seed)
+    counts = {}
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username='{}-{}'.format(prefix, i), password='!')
+            for i in range(users)
+        ])
+        authors = list(User.objects.filter(
+            username__in=['{}-{}'.format(prefix, i) for i in range(users)]
+        ).order_by('username'))
+        counts['users'] = len(authors)
+
+        Shelf.objects.bulk_create([
+            Shelf(name='{} {}'.format(prefix, i).title(),
+                  code='{}-{}'.format(prefix[:10], i), cols=cols, rows=rows,
+                  nums=cols * rows, desc=sentence(rng, 6), author=author)
+            for author in authors for i in range(shelves)
+        ], batch_size=BATCH_SIZE)
+        shelf_ids = list(Shelf.objects.filter(
+            author__in=authors).order_by('id').values_list('id', flat=True))
+        counts['shelves'] = len(shelf_ids)
+
+        Container.objects.bulk_create([
+            Container(shelf_id=shelf_id, col=col + 1, row=row + 1)
+            for shelf_id in shelf_ids
+            for col in range(cols) for row in range(rows)
+        ], batch_size=BATCH_SIZE)
+        containers = list(Container.objects.filter(
+            shelf__author__in=authors
+        ).order_by('id').values_list('id', 'shelf__author'))
+        counts['containers'] = len(containers)
+
+        occupied = rng.sample(containers, int(len(containers) * fill))
+        occupied.sort()
+        customers = [
+            Customer(
+                uuid=uuid.UUID(int=rng.getrandbits(128), version=4),
+                code='{}-{:06d}'.format(prefix[:8], i),
+                name='{} {}'.format(rng.choice(NAMES), i),
+                note=sentence(rng, 4), author_id=author_id)
+            for i, (__, author_id) in enumerate(occupied)
+        ]
+        Customer.objects.bulk_create(customers, batch_size=BATCH_SIZE)
+        counts['customers'] = len(customers)
+
+        Binder.objects.bulk_create([
+            Binder(
+                title=sentence(rng, 2).title(),
+                content=sentence(rng, rng.randint(5, 40)),
+                color='{:06x}'.format(rng.getrandbits(24)),
+                container_id=container_id, customer=customer)
+            for (container_id, __), customer in zip(occupied, customers)
+        ], batch_size=BATCH_SIZE)
+        binder_ids = list(Binder.objects.filter(
+            customer__author__in=authors
+        ).order_by('id').values_list('id', flat=True))
+        counts['binders'] = len(binder_ids)
+
+        names = [
+            store(ContentFile(sentence(rng, 200).encode()),
+                  '{}-{}.txt'.format(prefix, i))
+            for i in range(SAMPLES if attachments else 0)
+        ]
+        files = [rng.choice(names) for __ in binder_ids
+                 for __ in range(attachments)]
+        Attached.objects.bulk_create([
+            Attached(title=sentence(rng, 1).title(), binder_id=binder_id,
+                     file=name)
+            for binder_id, name in zip(
+                (pk for pk in binder_ids for __ in range(attachments)),
+                files)
+        ], batch_size=BATCH_SIZE)
+        counts['attachments'] = len(files)
+        # NOTE: The blobs count the attachments sharing them.
+        for name in set(names):
+            if files.count(name):
+                Blob.objects.filter(name=name).update(
+                    references=files.count(name))
+            else:
+                release(name)
+
+        recount_binders()
+        rebuild_locations()
+    if index:
+        search.rebuild_index()
+    return counts
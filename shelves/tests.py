@@ -1,22 +1,121 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import logging
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import (
+    TestCase, TransactionTestCase, modify_settings, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
+from django.urls import reverse
+from django.utils import timezone
 
 # from django.urls import reverse, resolve
 
 # from requests.auth import HTTPBasicAuth
 
 # from rest_framework import status
-# from rest_framework.test import (
-#     force_authenticate,
-#     RequestsClient,
-#     APITestCase,
-#     APIRequestFactory,
-#     APIClient
-# )
-
-from .models import Customer
+from rest_framework.test import (
+    force_authenticate,
+    # RequestsClient,
+    # APITestCase,
+    APIRequestFactory,
+    # APIClient
+)
+
+from .allocation import suggest
+from .benchmarks import (
+    create_fixtures,
+    get_requests,
+    get_missing,
+    run_benchmarks,
+)
+from .events import stream
+from .exports import export, get_rows
+from .extraction import extract_text
+from .locations import locate, rebuild_locations
+from .logs import (
+    JSONFormatter,
+    QueueListenerHandler,
+    RequestContextFilter,
+    SamplingFilter,
+)
+from .moves import plan_moves, plan_compaction, apply_moves
+from .imports import (
+    import_customers,
+    queue_import,
+    claim_import_job,
+    run_import_job,
+)
+from .models import (
+    Customer,
+    Shelf,
+    Container,
+    Binder,
+    BinderDeletion,
+    Upload,
+    ImportJob,
+    ShelfEvent,
+    AttachmentUpload,
+    AttachmentUploadPart,
+    Blob,
+    Attached,
+)
+from .previews import claim_attachments, generate_preview
+from .queries import QueryBudgetExceeded, normalize, query_budget
+from .search import search_binders, highlight
+from .synthetic import generate
+from .uploads import (
+    save_part,
+    purge,
+    queue_completion,
+    claim_upload,
+    run_upload,
+)
+from .views import attachment_preview
 # from .api.serializers import CustomerBinderSerializer, BinderSerializer
+from .api.planner import plan_queryset
+from .api.sync import get_changes
+from .api.views import (
+    ShelfList,
+    ShelfDetail,
+    ShelfGrid,
+    LocationLookup,
+    BinderViewSet,
+    AttachmentUploadList,
+    AttachmentUploadDetail,
+    AttachmentUploadPartView,
+    AttachmentUploadComplete,
+)
+from .api.serializers import CustomerSerializer, ShelfDetailSerializer
+
+
+class TemporaryMediaMixin:
+    """Write the files of the test case to a temporary ``MEDIA_ROOT``."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.media_settings.disable()
+            shutil.rmtree(cls.media_root, ignore_errors=True)
 
 
 class CustomerTestCase(TestCase):
@@ -64,3 +163,1065 @@ class CustomerTestCase(TestCase):
         Customer.objects.create(**customer)
         with self.assertRaises(IntegrityError):
             Customer.objects.create(**customer)
+
+
+class ShelfTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Tim the Enchanter')
+
+    def test_containers_creation(self):
+        """Containers are created in bulk with their coordinates."""
+        shelf = Shelf.objects.create(
+            name='Castle', code='castle', cols=3, rows=2, author=self.user)
+        containers = Container.objects.filter(shelf=shelf)
+        self.assertEqual(shelf.nums, 6)
+        self.assertEqual(containers.count(), 6)
+        self.assertEqual(
+            sorted(containers.values_list('col', 'row')),
+            [(c, r) for c in range(1, 4) for r in range(1, 3)])
+
+    def test_containers_creation_queries(self):
+        """The number of queries doesn't grow with the shelf size."""
+        containers = [Container() for __ in range(32 * 8)]
+        batches = -(-len(containers) // Container.get_batch_size(containers))
+        # NOTE: The savepoint, the shelf and its release, and the batches.
+        with self.assertNumQueries(3 + batches):
+            Shelf.objects.create(
+                name='Bridge', code='bridge', cols=32, rows=8,
+                author=self.user)
+
+    @override_settings(SHELVES_MAX_CONTAINERS=8)
+    def test_max_containers(self):
+        shelf = Shelf(
+            name='Cave', code='cave', cols=3, rows=3, author=self.user)
+        with self.assertRaises(ValidationError):
+            shelf.clean()
+
+
+class BinderCountTestCase(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='Brother Maynard')
+        self.shelf = Shelf.objects.create(
+            name='Chapel', code='chapel', cols=2, rows=1, author=user)
+        self.first, self.second = Container.objects.filter(
+            shelf=self.shelf).order_by('col')
+
+    def assertCounts(self, shelf, first, second):
+        self.shelf.refresh_from_db()
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(
+            (self.shelf.binders_count,
+             self.first.binders_count,
+             self.second.binders_count),
+            (shelf, first, second))
+
+    def test_create_move_delete(self):
+        binder = Binder.objects.create(title='Grenade', container=self.first)
+        self.assertCounts(1, 1, 0)
+        binder.container = self.second
+        binder.save()
+        self.assertCounts(1, 0, 1)
+        binder.title = 'Holy Hand Grenade'
+        binder.save()
+        self.assertCounts(1, 0, 1)
+        binder.delete()
+        self.assertCounts(0, 0, 0)
+
+    def test_stale_save(self):
+        """Saving a stale shelf or container keeps the counts."""
+        Binder.objects.create(title='Grenade', container=self.first)
+        self.shelf.code = 'antioch'
+        self.shelf.save()
+        self.first.row = 2
+        self.first.save()
+        self.assertCounts(1, 1, 0)
+
+    def test_events(self):
+        binder = Binder.objects.create(title='Grenade', container=self.first)
+        binder.container = self.second
+        binder.save()
+        binder.save()
+        binder.delete()
+        self.assertEqual(
+            list(ShelfEvent.objects.filter(shelf=self.shelf).order_by(
+                'id').values_list('kind', 'container_id')),
+            [('placed', self.first.id),
+             ('removed', self.first.id),
+             ('placed', self.second.id),
+             ('updated', self.second.id),
+             ('removed', self.second.id)])
+
+    @override_settings(SHELVES_EVENTS_TIMEOUT=60)
+    def test_stream_returns_events(self):
+        """The stream closes as soon as it has sent the waiting events."""
+        Binder.objects.create(title='Grenade', container=self.first)
+        messages = list(stream(self.shelf, 0))
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith('retry:'))
+        self.assertIn('event: placed', messages[1])
+
+
+class BinderSearchTestCase(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='Roger the Shrubber')
+        shelf = Shelf.objects.create(
+            name='Shrubbery', code='shrubbery', nums=2, author=user)
+        container = Container.objects.filter(shelf=shelf).first()
+        self.customer = Customer.objects.create(
+            code='ni', name='Knights', author=user)
+        self.herring = Binder.objects.create(
+            title='Herring', content='A shrubbery', container=container,
+            customer=self.customer)
+        self.shrubbery = Binder.objects.create(
+            title='Shrubbery', content='Not too expensive',
+            container=container)
+
+    def search(self, query):
+        return list(search_binders(Binder.objects.all(), query))
+
+    def test_prefix_and_rank(self):
+        """The title matches rank before the content matches."""
+        self.assertEqual(self.search('shrub'), [self.shrubbery, self.herring])
+        self.assertEqual(self.search('shrub expens'), [self.shrubbery])
+
+    def test_customer_changes(self):
+        self.assertEqual(self.search('knights'), [self.herring])
+        self.customer.name = 'Who say Ni'
+        self.customer.save()
+        self.assertEqual(self.search('knights'), [])
+
+    def test_deleted_binder(self):
+        self.herring.delete()
+        self.assertEqual(self.search('herring'), [])
+
+    def test_attachments(self):
+        """The extracted text of the attachments is searchable."""
+        note = Attached.objects.create(
+            title='Note', binder=self.shrubbery, file=SimpleUploadedFile(
+                'note.txt', b'Cut down the mightiest tree'))
+        sheet = Attached.objects.create(
+            title='Sheet', binder=self.herring, file=SimpleUploadedFile(
+                'sheet.csv', b'tool,price\nherring,mighty\n'))
+        self.assertEqual(self.search('mighti'), [])
+        self.assertEqual(extract_text(note), Attached.DONE)
+        self.assertEqual(extract_text(sheet), Attached.DONE)
+        self.assertEqual(sheet.text, 'tool price\nherring mighty')
+        self.assertEqual(self.search('mighti tree'), [self.shrubbery])
+        self.assertEqual(
+            set(self.search('might')), {self.shrubbery, self.herring})
+
+        note.delete()
+        self.assertEqual(self.search('tree'), [])
+
+    def test_snippets(self):
+        self.assertEqual(
+            highlight('<b>\x02Ni\x03</b>'),
+            '&lt;b&gt;<mark>Ni</mark>&lt;/b&gt;')
+        binders = search_binders(Binder.objects.all(), 'herr', snippets=True)
+        self.assertEqual(
+            highlight(binders[0].snippet), '<mark>Herring</mark>')
+
+    def test_pages(self):
+        container = self.herring.container
+        for i in range(settings.SHELVES_SEARCH_PAGE_SIZE):
+            Binder.objects.create(
+                title='Shrubbery {}'.format(i), container=container)
+        url = reverse('shelves:binders')
+        response = self.client.get(url, {'q': 'shrub', 'page': 2})
+        self.assertContains(response, '<mark>', count=2)
+        self.assertContains(response, 'Page 2 of 2')
+        with query_budget(10) as context:
+            cached = self.client.get(url, {'q': 'shrub', 'page': 2})
+        self.assertEqual(cached.content, response.content)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'shelves_binder' in query['sql']])
+        self.herring.content = 'A hedge'
+        self.herring.save()
+        response = self.client.get(url, {'q': 'shrub', 'page': 2})
+        self.assertContains(response, '<mark>', count=1)
+
+
+class ImportCustomersTestCase(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Sir Bedevere')
+        Customer.objects.create(code='witch', author=self.user)
+
+    def upload(self, content):
+        return Upload.objects.create(
+            csv_file=SimpleUploadedFile('customers.csv', content.encode()))
+
+    def test_import(self):
+        upload = self.upload(
+            'code,name,note\n'
+            'witch,Witch,Already there\n'
+            'duck,Duck,\n'
+            'duck,Duck,Duplicated\n'
+            'not a slug,Newt,\n'
+            '\n'
+            'wood,Wood,"Floats,\nlike a duck"\n'
+        )
+        report = import_customers(upload, self.user, chunk_size=1)
+        self.assertEqual(report.rows, 5)
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.skipped, 2)
+        self.assertEqual([line for line, __ in report.errors], [5])
+        self.assertEqual(
+            Customer.objects.get(code='wood').note, 'Floats,\nlike a duck')
+
+    def test_missing_header(self):
+        upload = self.upload('name,note\nWitch,\n')
+        with self.assertRaises(ValidationError):
+            import_customers(upload, self.user)
+
+
+class ImportJobTestCase(TemporaryMediaMixin, TransactionTestCase):
+    """The import runs in a thread, which needs the committed data."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='Sir Robin')
+
+    def test_import_job(self):
+        upload = Upload.objects.create(csv_file=SimpleUploadedFile(
+            'customers.csv', b'code\nduck\nnot a slug\n'))
+        job = ImportJob.objects.create(upload=upload, author=self.user)
+        self.assertEqual(claim_import_job(), job)
+        self.assertIsNone(claim_import_job())
+        job = run_import_job(job)
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual((job.rows, job.customers_created), (2, 1))
+        self.assertEqual(job.error_list[0]['line'], 3)
+
+
+class UniqueCodeTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Dennis')
+        Customer.objects.create(code='peasant', author=self.user)
+        request = APIRequestFactory().post('/')
+        request.user = self.user
+        self.context = {'request': request}
+
+    def test_single(self):
+        serializer = CustomerSerializer(
+            data={'code': 'peasant'}, context=self.context)
+        self.assertFalse(serializer.is_valid())
+        serializer = CustomerSerializer(
+            data={'code': 'king'}, context=self.context)
+        self.assertTrue(serializer.is_valid())
+
+    def test_many(self):
+        """The codes are checked with one query whatever the payload."""
+        data = [{'code': 'code-{}'.format(i)} for i in range(64)]
+        serializer = CustomerSerializer(
+            data=data, many=True, context=self.context)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        data += [{'code': 'peasant'}, {'code': 'code-0'}]
+        serializer = CustomerSerializer(
+            data=data, many=True, context=self.context)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('code-0, peasant', str(serializer.errors))
+
+
+class ShelfDetailQueriesTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Tim')
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        self.context = {'request': request}
+
+    def create_shelf(self, code, cols, rows):
+        shelf = Shelf.objects.create(
+            name=code, code=code, cols=cols, rows=rows, author=self.user)
+        for container in Container.objects.filter(shelf=shelf):
+            customer = Customer.objects.create(
+                code='{}-{}'.format(code, container.id), author=self.user)
+            Binder.objects.create(
+                title='Binder', container=container, customer=customer)
+        return shelf
+
+    def assertShelfQueries(self, shelf, num):
+        serializer = ShelfDetailSerializer(context=self.context)
+        queryset = plan_queryset(Shelf.objects.filter(pk=shelf.pk), serializer)
+        with self.assertNumQueries(num):
+            data = ShelfDetailSerializer(
+                queryset.get(), context=self.context).data
+        self.assertEqual(len(data['container_set']), shelf.nums)
+
+    def test_constant_queries(self):
+        """Shelf, containers and binders with their customers."""
+        self.assertShelfQueries(self.create_shelf('small', 2, 2), 3)
+        self.assertShelfQueries(self.create_shelf('large', 8, 8), 3)
+
+
+class QueryBudgetTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Cleese')
+        self.shelf = Shelf.objects.create(
+            name='Camelot', code='camelot', cols=4, rows=4, author=self.user)
+        for container in self.shelf.container_set.all():
+            Binder.objects.create(
+                title='Grail', container=container,
+                customer=Customer.objects.create(
+                    code='knight-{}'.format(container.id), author=self.user))
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 1 AND name = 'Robin'"),
+            normalize("SELECT * FROM t WHERE id = 22 AND name = 'O''Brien'"))
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (1, 2, 3)'),
+            'SELECT * FROM t WHERE id IN (...)')
+
+    def test_duplicates(self):
+        containers = Container.objects.filter(shelf=self.shelf)
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(20):
+                for container in containers:
+                    container.shelf.code
+        with query_budget(2):
+            containers.select_related('shelf')[0].shelf.code
+            self.shelf.container_set.count()
+
+    def test_shelf_detail(self):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        with query_budget('shelves-api:shelf-detail'):
+            response = ShelfDetail.as_view()(request, code='camelot')
+        self.assertEqual(len(response.data['container_set']), 16)
+
+    @override_settings(DEBUG=True)
+    @modify_settings(MIDDLEWARE={
+        'append': 'shelves.queries.QueryBudgetMiddleware'})
+    def test_middleware(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse(
+            'shelves-api:shelf-detail', kwargs={'code': 'camelot'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response['X-Query-Count']), 4)
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+
+
+class AdminChangelistTestCase(TestCase):
+    """The changelists query as much for many rows as for a few."""
+
+    def setUp(self):
+        self.user = User.objects.create(
+            username='Chapman', is_staff=True, is_superuser=True)
+        self.client.force_login(self.user)
+
+    def fill(self, code, cols, rows):
+        shelf = Shelf.objects.create(
+            name=code, code=code, cols=cols, rows=rows, author=self.user)
+        for container in shelf.container_set.all():
+            Binder.objects.create(
+                title='Parrot', container=container,
+                customer=Customer.objects.create(
+                    code='{}-{}'.format(code, container.id),
+                    author=self.user))
+
+    def count_queries(self, view_name):
+        with query_budget(view_name) as context:
+            response = self.client.get(reverse(view_name))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_constant_queries(self):
+        view_names = (
+            'admin:shelves_customer_changelist',
+            'admin:shelves_shelf_changelist',
+            'admin:shelves_container_changelist',
+            'admin:shelves_binder_changelist',
+        )
+        self.fill('few', 2, 2)
+        few = [self.count_queries(view_name) for view_name in view_names]
+        self.fill('many', 10, 12)
+        many = [self.count_queries(view_name) for view_name in view_names]
+        self.assertEqual(few, many)
+
+
+class ConditionalGetTestCase(TestCase):
+
+    def setUp(self):
+        # NOTE: The API views may act as the debugging user.
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Patsy')
+        self.shelf = Shelf.objects.create(
+            name='Camelot', code='camelot', nums=2, author=self.user)
+        self.binder = Binder.objects.create(
+            title='Coconuts', container=self.shelf.container_set.first())
+        self.view = ShelfDetail.as_view()
+
+    def get(self, **headers):
+        request = APIRequestFactory().get('/', **headers)
+        force_authenticate(request, user=self.user)
+        return self.view(request, code='camelot')
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.binder.delete()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_since(self):
+        """A deletion dates the shelf, which lists the binders."""
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(
+            self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.binder.delete()
+        # NOTE: The HTTP dates are to the second.
+        BinderDeletion.objects.update(
+            deleted=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(
+            self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_undated_list(self):
+        """The shelves list can't date the deletions of its shelves."""
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        response = ShelfList.as_view()(request)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+
+class PaginationTestCase(TestCase):
+
+    def setUp(self):
+        # NOTE: The API views may act as the debugging user.
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Brother Maynard')
+        shelf = Shelf.objects.create(
+            name='Antioch', code='antioch', nums=3, author=self.user)
+        self.binders = [
+            Binder.objects.create(
+                title='Grenade {}'.format(i), container=container)
+            for i, container in enumerate(shelf.container_set.all())]
+        self.view = BinderViewSet.as_view({'get': 'list'})
+
+    def walk(self, url):
+        """Return the ids of every page, following the next links."""
+        ids = []
+        while url:
+            request = APIRequestFactory().get(url)
+            force_authenticate(request, user=self.user)
+            data = self.view(request).data
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(binder['id'] for binder in data['results'])
+            url = data['next']
+        return ids
+
+    def test_cursor(self):
+        self.binders[0].title = 'Holy hand grenade'
+        self.binders[0].save()
+        self.assertEqual(
+            self.walk('/binders/?page_size=2'),
+            sorted((binder.id for binder in self.binders), reverse=True))
+
+    def test_search(self):
+        with CaptureQueriesContext(connection) as context:
+            ids = self.walk('/binders/?q=grenade&limit=2')
+        self.assertEqual(
+            sorted(ids), sorted(binder.id for binder in self.binders))
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'COUNT(' in query['sql'].upper()])
+
+
+class ShelfGridTestCase(TestCase):
+
+    def setUp(self):
+        # NOTE: The API views may act as the debugging user.
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Patsy')
+        self.shelf = Shelf.objects.create(
+            name='Camelot', code='camelot', nums=2, author=self.user)
+        self.binder = Binder.objects.create(
+            title='Coconuts', container=self.shelf.container_set.first())
+
+    def test_grid(self):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        data = ShelfGrid.as_view()(request, code='camelot').data
+        self.assertEqual(len(data['containers']), 2)
+        self.assertEqual(data['occupancy'], 'gA==')
+        self.assertEqual(data['binders'], [[0, self.binder.id, '']])
+
+
+class BinderSyncTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Zoot')
+        shelf = Shelf.objects.create(
+            name='Anthrax', code='anthrax', nums=1, author=self.user)
+        self.container = shelf.container_set.get()
+        self.binders = Binder.objects.filter(container=self.container)
+
+    def test_sync(self):
+        first, second, third = [
+            Binder.objects.create(title=title, container=self.container)
+            for title in ('Dingo', 'Zoot', 'Midget')]
+        changes = get_changes(self.binders, self.user, None, 2)
+        self.assertEqual(changes['binders'], [first, second])
+        self.assertTrue(changes['more'])
+        changes = get_changes(self.binders, self.user, changes['cursor'], 2)
+        self.assertEqual(changes['binders'], [third])
+        self.assertFalse(changes['more'])
+
+        first.save()
+        second_id = second.id
+        second.delete()
+        changes = get_changes(self.binders, self.user, changes['cursor'], 2)
+        self.assertEqual(changes['binders'], [first])
+        self.assertEqual(changes['deleted'], [second_id])
+        changes = get_changes(self.binders, self.user, changes['cursor'], 2)
+        self.assertEqual((changes['binders'], changes['deleted']), ([], []))
+
+    def test_deleted_limit(self):
+        binders = [
+            Binder.objects.create(title=title, container=self.container)
+            for title in ('Dingo', 'Zoot', 'Midget')]
+        cursor = get_changes(self.binders, self.user, None, 5)['cursor']
+        ids = [binder.id for binder in binders]
+        for binder in binders:
+            binder.delete()
+        changes = get_changes(self.binders, self.user, cursor, 2)
+        self.assertEqual(changes['deleted'], ids[:2])
+        self.assertTrue(changes['more'])
+        changes = get_changes(self.binders, self.user, changes['cursor'], 2)
+        self.assertEqual(changes['deleted'], ids[2:])
+        self.assertFalse(changes['more'])
+
+
+class ExportTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Concorde')
+        shelf = Shelf.objects.create(
+            name='Swamp', code='swamp', cols=1, rows=1, author=self.user)
+        customer = Customer.objects.create(code='herbert', author=self.user)
+        Binder.objects.create(
+            title='Tower', container=shelf.container_set.get(),
+            customer=customer)
+
+    def test_chunks(self):
+        for code in ('father', 'guest', 'groom'):
+            Customer.objects.create(code=code, author=self.user)
+        rows = get_rows('customers', self.user, chunk_size=2)
+        self.assertEqual(
+            sorted(code for code, __, __ in rows),
+            ['father', 'groom', 'guest', 'herbert'])
+
+    def test_binders(self):
+        lines = list(export('binders', self.user, 'csv'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',herbert,swamp,', lines[1])
+        line, = export('binders', self.user, 'ndjson')
+        self.assertIn('"shelf": "swamp", "container": ', line)
+
+
+@override_settings(SHELVES_UPLOAD_PART_SIZE=4)
+class AttachmentUploadTestCase(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='Prince Herbert')
+        shelf = Shelf.objects.create(
+            name='Tower', code='tower', nums=1, author=user)
+        binder = Binder.objects.create(
+            title='Song', container=shelf.container_set.get())
+        self.upload = AttachmentUpload.objects.create(
+            binder=binder, author=user, title='Song', filename='song.txt',
+            size=10, sha256=hashlib.sha256(b'I just sin').hexdigest())
+
+    def test_resume(self):
+        """The parts may be sent in any order and sent again."""
+        save_part(self.upload, 3, io.BytesIO(b'in'))
+        save_part(self.upload, 1, io.BytesIO(b'I ju'))
+        with self.assertRaises(ValidationError):
+            queue_completion(self.upload)
+        with self.assertRaises(ValidationError):
+            save_part(self.upload, 2, io.BytesIO(b'st s'), sha256='0' * 64)
+        with self.assertRaises(ValidationError):
+            save_part(self.upload, 2, io.BytesIO(b'st si'))
+        save_part(self.upload, 2, io.BytesIO(b'st  '))
+        save_part(
+            self.upload, 2, io.BytesIO(b'st s'),
+            sha256=hashlib.sha256(b'st s').hexdigest())
+        queue_completion(self.upload)
+        self.upload.refresh_from_db()
+        with self.assertRaises(ValidationError):
+            save_part(self.upload, 2, io.BytesIO(b'st s'))
+        upload = claim_upload()
+        self.assertEqual(upload, self.upload)
+        run_upload(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, AttachmentUpload.DONE)
+        upload.attached.file.open('rb')
+        self.assertEqual(upload.attached.file.read(), b'I just sin')
+        upload.attached.file.close()
+        self.assertFalse(AttachmentUploadPart.objects.exists())
+
+    def test_purge(self):
+        save_part(self.upload, 1, io.BytesIO(b'I ju'))
+        part = AttachmentUploadPart.objects.get()
+        self.assertEqual(purge(timezone.now() - timedelta(hours=1)), 0)
+        self.assertEqual(purge(timezone.now() + timedelta(seconds=1)), 1)
+        self.assertFalse(AttachmentUpload.objects.exists())
+        self.assertFalse(default_storage.exists(part.file.name))
+
+    def test_checksum_mismatch(self):
+        """A file not matching its checksum may be uploaded again."""
+        for number, part in enumerate((b'I ju', b'st s', b'ip'), 1):
+            save_part(self.upload, number, io.BytesIO(part))
+        queue_completion(self.upload)
+        run_upload(claim_upload())
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, AttachmentUpload.UPLOADING)
+        self.assertTrue(self.upload.error)
+        self.assertFalse(Attached.objects.exists())
+        save_part(self.upload, 3, io.BytesIO(b'in'))
+        queue_completion(self.upload)
+        run_upload(claim_upload())
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, AttachmentUpload.DONE)
+
+
+class AttachmentUploadAPITestCase(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        # NOTE: The API views may act as the debugging user.
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Concorde')
+        shelf = Shelf.objects.create(
+            name='Swamp', code='swamp', nums=1, author=self.user)
+        self.binder = Binder.objects.create(
+            title='Note', container=shelf.container_set.get())
+        self.factory = APIRequestFactory()
+
+    def request(self, method, view, data=None, headers=None, **kwargs):
+        if method == 'put':
+            request = self.factory.put(
+                '/', data, content_type='application/octet-stream',
+                **(headers or {}))
+        else:
+            request = getattr(self.factory, method)('/', data, format='json')
+        force_authenticate(request, user=self.user)
+        return view.as_view()(request, **kwargs)
+
+    def create(self):
+        response = self.request('post', AttachmentUploadList, {
+            'binder': self.binder.id, 'title': 'Note',
+            'filename': 'note.txt', 'size': 6,
+            'sha256': hashlib.sha256(b'Ni! Ni').hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['uuid']
+
+    def test_upload(self):
+        uuid = self.create()
+        self.assertEqual(self.request(
+            'put', AttachmentUploadPartView, b'Ni! Ni', uuid=uuid, number='2',
+        ).status_code, 400)
+        self.assertEqual(self.request(
+            'put', AttachmentUploadPartView, b'Ni! Ni', uuid=uuid, number='1',
+            headers={'HTTP_X_CHECKSUM_SHA256': '0' * 64},
+        ).status_code, 400)
+        self.assertEqual(self.request(
+            'post', AttachmentUploadComplete, uuid=uuid).status_code, 400)
+        response = self.request(
+            'put', AttachmentUploadPartView, b'Ni! Ni', uuid=uuid, number='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['size'], 6)
+
+        response = self.request('get', AttachmentUploadDetail, uuid=uuid)
+        self.assertEqual(response.data['status'], AttachmentUpload.UPLOADING)
+        self.assertEqual([part['number'] for part in response.data['parts']],
+                         [1])
+        response = self.request('post', AttachmentUploadComplete, uuid=uuid)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], AttachmentUpload.QUEUED)
+        self.assertEqual(self.request(
+            'put', AttachmentUploadPartView, b'Ni! Ni', uuid=uuid, number='1',
+        ).status_code, 400)
+
+        run_upload(claim_upload())
+        response = self.request('get', AttachmentUploadDetail, uuid=uuid)
+        self.assertEqual(response.data['status'], AttachmentUpload.DONE)
+        attached = Attached.objects.get(pk=response.data['attached'])
+        self.assertEqual(attached.binder, self.binder)
+
+    def test_abort(self):
+        uuid = self.create()
+        self.request(
+            'put', AttachmentUploadPartView, b'Ni!', uuid=uuid, number='1')
+        response = self.request('delete', AttachmentUploadDetail, uuid=uuid)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(AttachmentUpload.objects.exists())
+        self.assertFalse(AttachmentUploadPart.objects.exists())
+
+    def test_other_binder(self):
+        other = User.objects.create(username='Tim the Enchanter')
+        shelf = Shelf.objects.create(
+            name='Cave', code='cave', nums=1, author=other)
+        binder = Binder.objects.create(
+            title='Rabbit', container=shelf.container_set.get())
+        response = self.request('post', AttachmentUploadList, {
+            'binder': binder.id, 'title': 'Rabbit',
+            'filename': 'rabbit.txt', 'size': 1,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('binder', response.data)
+
+
+class BlobStorageTestCase(TemporaryMediaMixin, TransactionTestCase):
+    """The files are deleted when the transactions commit."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='Sir Galahad')
+
+    def upload(self):
+        return Upload.objects.create(csv_file=SimpleUploadedFile(
+            'customers.csv', b'code\ncastle-anthrax\n'))
+
+    def test_deduplication(self):
+        first, second = self.upload(), self.upload()
+        self.assertEqual(first.csv_file.name, second.csv_file.name)
+        self.assertTrue(first.csv_file.name.startswith('blobs/'))
+        blob = Blob.objects.get()
+        self.assertEqual(blob.references, 2)
+
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.references, 1)
+        self.assertTrue(default_storage.exists(blob.name))
+        second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.name))
+
+    def test_rolled_back_delete(self):
+        upload = self.upload()
+        name = upload.csv_file.name
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                upload.delete()
+                raise IntegrityError
+        self.assertEqual(Blob.objects.get().references, 1)
+        self.assertTrue(default_storage.exists(name))
+        Upload.objects.get().delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_same_content_replacement(self):
+        upload = self.upload()
+        upload.csv_file = SimpleUploadedFile(
+            'again.csv', b'code\ncastle-anthrax\n')
+        upload.save()
+        self.assertEqual(Blob.objects.get().references, 1)
+
+    def test_duplicated_import(self):
+        job, queued = queue_import(self.upload(), self.user)
+        self.assertTrue(queued)
+        self.assertEqual(queue_import(self.upload(), self.user), (job, False))
+        job.status = ImportJob.DONE
+        job.save()
+        again, queued = queue_import(self.upload(), self.user)
+        self.assertTrue(queued)
+        self.assertNotEqual(again, job)
+
+
+class PreviewTestCase(TemporaryMediaMixin, TransactionTestCase):
+    """The previews are deleted when the transactions commit."""
+
+    def setUp(self):
+        user = User.objects.create(username='Tim the Enchanter')
+        shelf = Shelf.objects.create(
+            name='Cave', code='cave', nums=1, author=user)
+        self.binder = Binder.objects.create(
+            title='Map', container=shelf.container_set.get())
+
+    def attach(self, name, content):
+        return Attached.objects.create(
+            title=name, binder=self.binder,
+            file=SimpleUploadedFile(name, content))
+
+    def test_image(self):
+        from PIL import Image
+
+        image = io.BytesIO()
+        Image.new('RGB', (1024, 512)).save(image, 'PNG')
+        attached = self.attach('map.png', image.getvalue())
+        self.assertEqual(claim_attachments(10), [attached.pk])
+        self.assertEqual(claim_attachments(10), [])
+
+        self.assertEqual(generate_preview(attached, size=64), 'done')
+        with default_storage.open(attached.preview_name) as f:
+            self.assertEqual(Image.open(f).size, (64, 32))
+        url = attached.get_preview_url()
+        self.assertTrue(url.endswith('.png.preview.jpg'))
+
+        request = APIRequestFactory().get(url)
+        response = attachment_preview(
+            request, pk=attached.pk, name=url.rsplit('/', 1)[1])
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+
+        # NOTE: The preview is deleted with its blob.
+        attached.delete()
+        self.assertFalse(default_storage.exists(attached.preview_name))
+
+    def test_unsupported(self):
+        attached = self.attach('cave.txt', b'Follow only if ye be men.')
+        self.assertEqual(generate_preview(attached), 'none')
+        self.assertIsNone(attached.get_preview_url())
+        attached.file = SimpleUploadedFile('rabbit.txt', b'Run away!')
+        attached.save()
+        attached.refresh_from_db()
+        self.assertEqual(attached.preview_status, Attached.PENDING)
+
+
+class LocationTestCase(TestCase):
+
+    def setUp(self):
+        # NOTE: The API views may act as the debugging user.
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Dennis')
+        self.shelf = Shelf.objects.create(
+            name='Castle', code='castle', cols=2, rows=1, author=self.user)
+        self.first, self.second = self.shelf.container_set.order_by('col')
+        self.customer = Customer.objects.create(
+            code='dennis', author=self.user)
+        self.binder = Binder.objects.create(
+            title='Constitution', container=self.first,
+            customer=self.customer)
+
+    def locate(self, code):
+        return locate(self.user, customers=[code])[0][code]
+
+    def test_moves_and_renames(self):
+        self.assertEqual(self.locate('dennis'), {
+            'binder': self.binder.id, 'customer': 'dennis',
+            'shelf': 'castle', 'container': self.first.id,
+            'col': 1, 'row': 1,
+        })
+        self.binder.container = self.second
+        self.binder.save()
+        self.customer.code = 'peasant'
+        self.customer.save()
+        self.shelf.code = 'commune'
+        self.shelf.save()
+        self.assertIsNone(self.locate('dennis'))
+        location = self.locate('peasant')
+        self.assertEqual(location['container'], self.second.id)
+        self.assertEqual((location['shelf'], location['col']), ('commune', 2))
+
+        rebuild_locations()
+        self.assertEqual(self.locate('peasant'), location)
+        self.binder.delete()
+        self.assertIsNone(self.locate('peasant'))
+
+    def test_lookup(self):
+        request = APIRequestFactory().post('/', {
+            'customers': ['dennis', 'arthur'],
+            'binders': [self.binder.id],
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(3 if settings.DEBUG_USER_ID else 2):
+            response = LocationLookup.as_view()(request)
+        self.assertEqual(response.data['customers']['dennis']['row'], 1)
+        self.assertIsNone(response.data['customers']['arthur'])
+        self.assertEqual(
+            response.data['binders'][self.binder.id]['customer'], 'dennis')
+
+        other = User.objects.create(username='Old woman')
+        self.assertEqual(locate(other, binders=[self.binder.id]),
+                         ({}, {self.binder.id: None}))
+
+
+class AllocationTestCase(TestCase):
+
+    def setUp(self):
+        # NOTE: The API views may act as the debugging user.
+        self.user = User.objects.create(
+            id=settings.DEBUG_USER_ID or None, username='Brother Maynard')
+        self.chapel = Shelf.objects.create(
+            name='Chapel', code='chapel', cols=4, rows=1, author=self.user)
+        self.crypt = Shelf.objects.create(
+            name='Crypt', code='crypt', nums=2, author=self.user)
+        self.cells = list(self.chapel.container_set.order_by('col'))
+        for code, cell in (('a', self.cells[0]), ('z', self.cells[3])):
+            Binder.objects.create(
+                title=code, container=cell, customer=Customer.objects.create(
+                    code=code, author=self.user))
+
+    def containers(self, **kwargs):
+        return [slot['container'] for slot in suggest(self.user, **kwargs)]
+
+    def test_ranking(self):
+        crypt = list(
+            self.crypt.container_set.order_by('id').values_list(
+                'id', flat=True))
+        # NOTE: The empty shelf first, then the half full one.
+        self.assertEqual(
+            self.containers(),
+            crypt + [self.cells[1].id, self.cells[2].id])
+        self.assertEqual(
+            self.containers(customer_code='zz')[0], self.cells[2].id)
+        self.assertEqual(
+            self.containers(customer_code='zz', shelves=['crypt'])[0],
+            crypt[0])
+
+    def test_allocate(self):
+        customer = Customer.objects.create(code='b', author=self.user)
+        view = BinderViewSet.as_view({'post': 'allocate'})
+        request = APIRequestFactory().post('/', {
+            'title': 'Holy hand grenade',
+            'customer': str(customer.pk),
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['container'], self.cells[1].id)
+
+        for title in ('One', 'Two', 'Three', 'Five'):
+            request = APIRequestFactory().post(
+                '/?shelf=chapel', {'title': title}, format='json')
+            force_authenticate(request, user=self.user)
+            response = view(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.containers())
+
+
+class MoveTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='Sir Robin')
+        self.shelf = Shelf.objects.create(
+            name='Bridge', code='bridge', cols=2, rows=2, author=self.user)
+        self.cells = list(self.shelf.container_set.order_by('row', 'col'))
+        self.other = Shelf.objects.create(
+            name='Gorge', code='gorge', nums=1, author=self.user)
+        self.gorge = self.other.container_set.get()
+        self.binders = [
+            Binder.objects.create(title=title, container=self.cells[i])
+            for title, i in (('Name', 1), ('Quest', 3))
+        ]
+
+    def test_invalid_plans(self):
+        first, second = self.binders
+        with self.assertRaises(ValidationError):
+            plan_moves(self.user, [(first.id, self.cells[3].id)])
+        with self.assertRaises(ValidationError):
+            plan_moves(self.user, [(first.id, 0)])
+        stranger = User.objects.create(username='Bridgekeeper')
+        with self.assertRaises(ValidationError):
+            plan_moves(stranger, [(first.id, self.gorge.id)])
+        # NOTE: Swapping the binders leaves every container with one.
+        self.assertEqual(len(plan_moves(self.user, [
+            (first.id, self.cells[3].id), (second.id, self.cells[1].id),
+        ])), 2)
+
+    def test_apply(self):
+        first, second = self.binders
+        updated = first.updated
+        apply_moves(plan_moves(self.user, [(second.id, self.gorge.id)]))
+        self.assertEqual(apply_moves(plan_compaction(self.shelf)), 1)
+
+        self.assertEqual(
+            [cell.binders_count for cell in Container.objects.filter(
+                shelf=self.shelf).order_by('row', 'col')],
+            [1, 0, 0, 0])
+        self.gorge.refresh_from_db()
+        self.other.refresh_from_db()
+        self.shelf.refresh_from_db()
+        self.assertEqual(self.gorge.binders_count, 1)
+        self.assertEqual(
+            (self.shelf.binders_count, self.other.binders_count), (1, 1))
+        location = locate(self.user, binders=[second.id])[1][second.id]
+        self.assertEqual(location['shelf'], 'gorge')
+        self.assertEqual(location['container'], self.gorge.id)
+        first.refresh_from_db()
+        self.assertEqual(first.container_id, self.cells[0].id)
+        self.assertEqual(ShelfEvent.objects.filter(
+            kind=ShelfEvent.PLACED, shelf=self.other).count(), 1)
+        self.assertGreater(first.updated, updated)
+
+
+class SyntheticDataTestCase(TemporaryMediaMixin, TestCase):
+
+    def test_generate(self):
+        counts = generate(
+            prefix='knight', users=2, shelves=2, cols=2, rows=2, fill=0.5,
+            seed=1)
+        self.assertEqual(counts, {
+            'users': 2, 'shelves': 4, 'containers': 16, 'customers': 8,
+            'binders': 8, 'attachments': 8,
+        })
+        author = User.objects.get(username='knight-0')
+        self.assertEqual(
+            sum(Shelf.objects.filter(author=author).values_list(
+                'binders_count', flat=True)),
+            Binder.objects.filter(container__shelf__author=author).count())
+        codes, __ = locate(author, customers=['knight-000000'])
+        self.assertEqual(
+            codes['knight-000000'] is None,
+            not Customer.objects.filter(
+                author=author, code='knight-000000').exists())
+        self.assertEqual(
+            sum(Blob.objects.values_list('references', flat=True)), 8)
+
+        # NOTE: Every endpoint has its benchmark.
+        requests = get_requests(author, *create_fixtures(author))
+        self.assertEqual(get_missing(requests), [])
+
+    def test_run_benchmarks(self):
+        generate(
+            prefix='knight', users=1, shelves=2, cols=2, rows=2, fill=0.5,
+            seed=1)
+        author = User.objects.get(username='knight-0')
+        report = run_benchmarks(author, repeat=1)
+        self.assertEqual(report['meta']['missing'], [])
+        for key, result in report['results'].items():
+            self.assertLess(result['status'], 500, key)
+
+
+class LoggingTestCase(TestCase):
+
+    def test_request_records(self):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(JSONFormatter())
+        handler = QueueListenerHandler([target])
+        handler.addFilter(RequestContextFilter())
+        logger = logging.getLogger('shelves.requests')
+        logger.addHandler(handler)
+        try:
+            response = self.client.get(
+                reverse('shelves:binders'), HTTP_X_REQUEST_ID='ni')
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        self.assertEqual(response['X-Request-ID'], 'ni')
+        record = json.loads(stream.getvalue().splitlines()[-1])
+        self.assertEqual(record['request_id'], 'ni')
+        self.assertEqual(record['view'], 'shelves:binders')
+        self.assertEqual(record['status'], 200)
+        self.assertIn('duration_ms', record)
+
+    def test_sampling(self):
+        debug = logging.makeLogRecord(
+            {'levelno': logging.DEBUG, 'request_id': 'spam'})
+        info = logging.makeLogRecord(
+            {'levelno': logging.INFO, 'request_id': 'spam'})
+        self.assertFalse(SamplingFilter(0).filter(debug))
+        self.assertTrue(SamplingFilter(0).filter(info))
+        self.assertTrue(SamplingFilter(1).filter(debug))
+        sample = SamplingFilter(0.5)
+        self.assertEqual(
+            len({sample.filter(debug) for __ in range(10)}), 1)
@@ -0,0 +1,205 @@
+"""Resumable chunked uploads of binder attachments.
+
+An upload is initiated with the file name and size, then its parts are
+sent in any order, each one written to the storage as soon as it is
+received and checked against its SHA-256. A failed part is simply sent
+again. The completion only queues the upload: ``./manage.py runuploads``
+joins the parts into the attachment file, out of the web workers, and the
+client polls the upload until it is done. An upload whose file doesn't
+match its size or checksum goes back to uploading, with the error.
+
+The request bodies and the joined file go through temporary files, so the
+memory used doesn't depend on the size of the attachment.
+"""
+import hashlib
+import logging
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from .models import Attached, AttachmentUpload, AttachmentUploadPart
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 2**10
+
+
+def copy(source, destination, digest, limit=None):
+    """Copy ``source`` into ``destination`` updating ``digest``.
+
+    Return the number of bytes copied.
+    """
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            return size
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise ValidationError(
+                _('The part exceeds {} bytes.').format(limit), code='size')
+        digest.update(chunk)
+        destination.write(chunk)
+
+
+def save_part(upload, number, stream, sha256=''):
+    """Store the part ``number`` of ``upload`` read from ``stream``.
+
+    A part sent again replaces the previous one. The file is written under
+    a name of its own before the upload row is locked, so concurrent
+    requests for the same part only wait for each other to swap the rows.
+    """
+    part_size = settings.SHELVES_UPLOAD_PART_SIZE
+    if upload.status != AttachmentUpload.UPLOADING:
+        raise ValidationError(
+            _('The upload is already completed.'), code='completed')
+    if not 1 <= number <= -(-upload.size // part_size):
+        raise ValidationError(
+            _('Invalid part number {}.').format(number), code='number')
+    digest = hashlib.sha256()
+    with tempfile.TemporaryFile() as f:
+        size = copy(stream, f, digest, limit=part_size)
+        if sha256 and sha256.lower() != digest.hexdigest():
+            raise ValidationError(
+                _('The part checksum does not match.'), code='checksum')
+        f.seek(0)
+        part = AttachmentUploadPart(
+            upload=upload, number=number, size=size,
+            sha256=digest.hexdigest())
+        part.file.save('{}/{}-{}'.format(
+            upload.uuid, number, uuid.uuid4().hex), File(f), save=False)
+    try:
+        with transaction.atomic():
+            # NOTE: The part row may not exist yet, so lock the upload.
+            locked = AttachmentUpload.objects.select_for_update().get(
+                pk=upload.pk)
+            if locked.status != AttachmentUpload.UPLOADING:
+                raise ValidationError(
+                    _('The upload is already completed.'), code='completed')
+            previous = list(AttachmentUploadPart.objects.filter(
+                upload=upload, number=number))
+            for old in previous:
+                old.delete()
+            part.save()
+            locked.save(update_fields=('updated',))
+    except Exception:
+        part.file.delete(save=False)
+        raise
+    for old in previous:
+        transaction.on_commit(lambda old=old: old.file.delete(save=False))
+    return part
+
+
+def check_parts(upload):
+    """Return the parts of ``upload``, unless some are missing."""
+    parts = list(upload.attachmentuploadpart_set.order_by('number'))
+    missing = set(range(1, len(parts) + 1)) ^ set(p.number for p in parts)
+    if missing or not parts:
+        raise ValidationError(_('Some parts are missing.'), code='missing')
+    if sum(part.size for part in parts) != upload.size:
+        raise ValidationError(
+            _('The parts size does not match the file size.'), code='size')
+    return parts
+
+
+def queue_completion(upload):
+    """Queue the join of the parts of ``upload``."""
+    with transaction.atomic():
+        upload = AttachmentUpload.objects.select_for_update().get(
+            pk=upload.pk)
+        if upload.status != AttachmentUpload.UPLOADING:
+            raise ValidationError(
+                _('The upload is already completed.'), code='completed')
+        check_parts(upload)
+        upload.status = AttachmentUpload.QUEUED
+        upload.error = ''
+        upload.save(update_fields=('status', 'error', 'updated'))
+    return upload
+
+
+def claim_upload():
+    """Mark the oldest queued upload as running and return it."""
+    with transaction.atomic():
+        upload = AttachmentUpload.objects.select_for_update().filter(
+            status=AttachmentUpload.QUEUED).order_by('updated').first()
+        if upload:
+            upload.status = AttachmentUpload.RUNNING
+            upload.save(update_fields=('status', 'updated'))
+    return upload
+
+
+def run_upload(upload):
+    """Complete ``upload``, recording the error if it fails."""
+    try:
+        complete(upload)
+    except ValidationError as e:
+        # NOTE: The client may send the parts again and complete again.
+        upload.status = AttachmentUpload.UPLOADING
+        upload.error = ' '.join(e.messages)
+        upload.save(update_fields=('status', 'error', 'updated'))
+    except Exception as e:
+        logger.exception('Attachment upload %s failed.', upload.pk)
+        upload.status = AttachmentUpload.FAILED
+        upload.error = str(e)
+        upload.save(update_fields=('status', 'error', 'updated'))
+    return upload
+
+
+def complete(upload):
+    """Join the parts of ``upload`` into a new attachment."""
+    parts = check_parts(upload)
+    digest = hashlib.sha256()
+    with tempfile.TemporaryFile() as f:
+        for part in parts:
+            part.file.open('rb')
+            try:
+                copy(part.file, f, digest)
+            finally:
+                part.file.close()
+        if upload.sha256 and upload.sha256.lower() != digest.hexdigest():
+            raise ValidationError(
+                _('The file checksum does not match.'), code='checksum')
+        f.seek(0)
+        attached = Attached(title=upload.title, binder=upload.binder)
+        attached.file.save(upload.filename, File(f), save=True)
+
+    delete_parts(upload)
+    upload.attached = attached
+    upload.status = AttachmentUpload.DONE
+    upload.error = ''
+    upload.save(update_fields=('attached', 'status', 'error', 'updated'))
+    return attached
+
+
+def delete_parts(upload):
+    """Delete the parts of ``upload`` and their files."""
+    for part in upload.attachmentuploadpart_set.all():
+        part.file.delete(save=False)
+        part.delete()
+
+
+def abort(upload):
+    """Delete ``upload`` and the files of its parts."""
+    delete_parts(upload)
+    upload.delete()
+
+
+def purge(before):
+    """Delete the uploads abandoned, failed or done before ``before`` and
+    return their number.
+    """
+    stale = AttachmentUpload.objects.filter(updated__lt=before, status__in=(
+        AttachmentUpload.UPLOADING,
+        AttachmentUpload.FAILED,
+        AttachmentUpload.DONE,
+    ))
+    count = 0
+    for upload in stale.iterator():
+        abort(upload)
+        count += 1
+    return count
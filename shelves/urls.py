@@ -3,6 +3,7 @@ from .views import (
     import_data,
     BinderListView,
     BinderDetailView,
+    attachment_preview,
     AureliaView,
 )
 
@@ -15,6 +16,11 @@ urlpatterns = [
         BinderDetailView.as_view(),
         name='binders-detail'
     ),
+    url(
+        r'^attachments/(?P<pk>\d+)/preview/(?P<name>[^/]+)$',
+        attachment_preview,
+        name='attachment-preview'
+    ),
     # The front-end
     url(r'^au/', AureliaView.as_view(), name='aurelia'),
 ]
@@ -1,8 +1,13 @@
-import operator
-from functools import reduce
-
-from django.db.models import Q
-from django.shortcuts import render
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
 from django.views.generic import TemplateView
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
@@ -10,7 +15,8 @@ from django.views.generic.detail import DetailView
 # from django.utils.translation import ugettext as _
 
 from .forms import UploadForm
-from .models import Customer, Shelf, Binder
+from .models import Customer, Shelf, Binder, Attached
+from .search import search_binders, highlight, get_generation
 
 
 def import_data(request):
@@ -94,8 +100,16 @@ def import_data(request):
 # Search
 # https://www.calazan.com/adding-basic-search-to-your-django-site/
 class BinderListView(ListView):
+    """List and search the binders, a page at a time.
+
+    The results of each user, query and page are rendered once in
+    ``binder_results.html`` and cached until the search index changes.
+    """
     model = Binder
-    # paginate_by = 8
+    paginate_by = settings.SHELVES_SEARCH_PAGE_SIZE
+    # NOTE: Named, as the cached pages have no ``object_list`` to infer it.
+    template_name = 'shelves/binder_list.html'
+    results_template_name = 'shelves/binder_results.html'
 
     def get_queryset(self):
         """Override queryset.
@@ -104,37 +118,68 @@ class BinderListView(ListView):
         ``title``,
         ``content``,
         ``customer__code``,
-        ``customer__name``.
+        ``customer__name``
+        through the search index, best matches first.
 
         """
 
         queryset = super(BinderListView, self).get_queryset()
         query = self.request.GET.get('q')
         if query:
-            query_list = query.split()
-            # TODO: DRY because of ``BinderList`` queryset in API.
-            queryset = queryset.filter(
-                reduce(
-                    operator.and_,
-                    (Q(title__icontains=q) for q in query_list)
-                ) | reduce(
-                    operator.and_,
-                    (Q(content__icontains=q) for q in query_list)
-                ) | reduce(
-                    operator.and_,
-                    (Q(customer__code__icontains=q) for q in query_list)
-                ) | reduce(
-                    operator.and_,
-                    (Q(customer__name__icontains=q) for q in query_list)
-                )
-            )
+            queryset = search_binders(queryset, query, snippets=True)
+        else:
+            queryset = queryset.order_by('id')
 
         return queryset
 
+    def get_cache_key(self):
+        key = json.dumps([
+            self.request.user.pk,
+            self.request.GET.get('q', ''),
+            self.request.GET.get(self.page_kwarg, '1'),
+        ])
+        return 'shelves:binders:{}:{}'.format(
+            get_generation(), hashlib.md5(key.encode()).hexdigest())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for binder in context['object_list']:
+            binder.highlight = highlight(getattr(binder, 'snippet', '') or '')
+        context['query'] = self.request.GET.get('q', '')
+        return context
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_cache_key()
+        results = cache.get(key)
+        if results is None:
+            self.object_list = self.get_queryset()
+            results = render_to_string(
+                self.results_template_name, self.get_context_data(), request)
+            cache.set(key, results, settings.SHELVES_SEARCH_CACHE_TIMEOUT)
+        return render(request, self.get_template_names(), {
+            'query': request.GET.get('q', ''),
+            'results': results,
+        })
+
 
 class BinderDetailView(DetailView):
     model = Binder
 
 
+def attachment_preview(request, pk, name):
+    """Serve the preview of an attachment.
+
+    The URL changes with the file, so the preview is cached for a year.
+    """
+    attached = get_object_or_404(
+        Attached, pk=pk, preview_status=Attached.DONE)
+    if name != os.path.basename(attached.preview_name):
+        raise Http404
+    response = FileResponse(
+        default_storage.open(attached.preview_name), content_type='image/jpeg')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
 class AureliaView(TemplateView):
     template_name = "shelves/au/index.html"
@@ -0,0 +1,26 @@
+"""Worker loop of the attachment pipelines, previews and text extraction."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_workers(claim, process, workers, once=False, interval=2, log=None):
+    """Process the attachments claimed by ``claim`` with ``process`` in a
+    pool of ``workers`` threads.
+
+    ``claim(limit)`` returns the primary keys of the claimed attachments
+    and ``process(pk)`` their status, passed to ``log(pk, status)``. Poll
+    every ``interval`` seconds, or return with ``once`` when none are
+    pending.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            pks = claim(workers * 4)
+            if pks:
+                statuses = pool.map(process, pks)
+                for pk, status in zip(pks, statuses):
+                    if log:
+                        log(pk, status)
+            elif once:
+                break
+            else:
+                time.sleep(interval)